@@ -0,0 +1,366 @@
+import argparse
+import glob
+import os
+import pickle
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+
+from analytics import ANALYTICS_DIR, JOIN_KEY
+from archive import (ARCHIVE_DIR, ARCHIVE_SCHEMA, RESPONSE_GLOB, fingerprint, migrate_v2, normalize,
+                     read_fragments)
+from store import RESPONSE_DB, ResponseStore
+
+# ─── Inter-Annotator Agreement ─────────────────────────────────────
+# A unit is one predicted label of one entity (article_id, entity_mention,
+# predicted_role); every evaluator who judged it contributes a makes_sense
+# verdict and a 1–5 confidence. Agreement is reported per language × fine
+# role and summed up to per language, per role and overall:
+#   fleiss_kappa        – on the verdicts, units with ≥ 2 ratings
+#   alpha_nominal       – Krippendorff's alpha on the verdicts
+#   alpha_confidence    – Krippendorff's alpha on confidence, ordinal metric
+#   pairwise            – per pair of evaluators, shared units and the share
+#                         of them with the same verdict
+#
+# Only sufficient statistics are kept: per-unit rating counts, and per
+# group the coincidence matrices and Fleiss sums. A batch of new ratings
+# subtracts the touched units' contributions, updates their counts and adds
+# them back, so its cost depends on the batch, not on everything seen so far.
+# The statistics are saved to analytics/agreement_state.pkl together with a
+# watermark of the sources read, and each run only reads what is new.
+
+VERDICTS = ["Yes", "No", "Unsure"]
+CONFIDENCE_LEVELS = 5
+STATE_FILE = "agreement_state.pkl"
+STATE_FORMAT = 1
+
+
+# ─── Statistics From Count Matrices ────────────────────────────────
+# `counts` is units × categories: how many ratings of each value a unit has.
+def coincidences(counts):
+    counts = np.asarray(counts, dtype=np.float64)
+    m = counts.sum(axis=1)
+    w = np.divide(1.0, m - 1, out=np.zeros_like(m), where=m > 1)
+    per_unit = np.einsum("uc,uk->uck", counts, counts)
+    per_unit[:, np.arange(counts.shape[1]), np.arange(counts.shape[1])] -= counts
+    return per_unit * w[:, None, None]
+
+
+def fleiss_terms(counts):
+    # Per unit: (P_i, 1, category counts), zero for units with < 2 ratings.
+    counts = np.asarray(counts, dtype=np.float64)
+    m = counts.sum(axis=1)
+    pairable = m > 1
+    p = np.divide((counts ** 2).sum(axis=1) - m, m * (m - 1), out=np.zeros_like(m), where=pairable)
+    return p, pairable.astype(np.float64), counts * pairable[:, None]
+
+
+def fleiss_kappa(p_sum, units, totals):
+    if units == 0 or totals.sum() == 0:
+        return np.nan
+    p_bar = p_sum / units
+    p_e = ((totals / totals.sum()) ** 2).sum()
+    return np.nan if p_e == 1 else (p_bar - p_e) / (1 - p_e)
+
+
+def nominal_delta(n_c):
+    return 1.0 - np.eye(len(n_c))
+
+
+def ordinal_delta(n_c):
+    # (n_c/2 + n_{c+1} + … + n_{k-1} + n_k/2)², from the value totals.
+    cum = np.cumsum(n_c)
+    values = np.arange(len(n_c))
+    lo, hi = np.minimum.outer(values, values), np.maximum.outer(values, values)
+    between = cum[hi] - cum[lo] + n_c[lo]
+    return (between - (n_c[:, None] + n_c[None, :]) / 2) ** 2
+
+
+def krippendorff_alpha(coincidence, delta=nominal_delta):
+    n_c = coincidence.sum(axis=1)
+    n = n_c.sum()
+    if n <= 1:
+        return np.nan
+    d = delta(n_c)
+    expected = (np.outer(n_c, n_c) * d).sum()
+    if expected == 0:
+        return np.nan
+    return 1.0 - (n - 1) * (coincidence * d).sum() / expected
+
+
+# ─── New Responses ─────────────────────────────────────────────────
+# The watermark holds the fingerprint (size, mtime) of every archive
+# partition and response CSV read, and the last row id read from each
+# response store. A partition or CSV that changed is read again in full;
+# update() ignores the ratings it has already seen.
+def read_new(sources, paths=None, db=RESPONSE_DB, archive_dir=ARCHIVE_DIR):
+    # → (frames, paths with an unknown schema, updated watermark)
+    sources = {name: dict(sources.get(name, {})) for name in ("archive", "fragments", "store")}
+    frames = []
+    if archive_dir:
+        for path in sorted(glob.glob(os.path.join(archive_dir, "*", "*.parquet"))):
+            key, stamp = os.path.abspath(path), fingerprint(path)
+            if sources["archive"].get(key) != stamp:
+                frames.append(pq.read_table(path, schema=ARCHIVE_SCHEMA).to_pandas())
+                sources["archive"][key] = stamp
+
+    paths = sorted(glob.glob(RESPONSE_GLOB)) if paths is None else paths
+    changed = [p for p in paths if sources["fragments"].get(os.path.abspath(p)) != fingerprint(p)]
+    fragments, unknown = read_fragments(changed)
+    frames += fragments
+    for path in changed:
+        if path not in unknown:
+            sources["fragments"][os.path.abspath(path)] = fingerprint(path)
+
+    if db and os.path.exists(db):
+        key = os.path.abspath(db)
+        rows = ResponseStore(db).read_frame(after_id=sources["store"].get(key, 0))
+        if len(rows):
+            frames.append(normalize(migrate_v2(rows.drop(columns=["id"]))))
+            sources["store"][key] = int(rows["id"].max())
+    return frames, unknown, sources
+
+
+def load_state(path):
+    try:
+        with open(path, "rb") as f:
+            fmt, stats = pickle.load(f)
+    except (FileNotFoundError, EOFError, pickle.UnpicklingError, AttributeError, ValueError):
+        return None
+    return stats if fmt == STATE_FORMAT else None
+
+
+def save_state(stats, path):
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        pickle.dump((STATE_FORMAT, stats), f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp, path)
+
+
+# ─── Running Agreement ─────────────────────────────────────────────
+def _grow(array, size):
+    if size <= len(array):
+        return array
+    grown = np.zeros((max(size, 2 * len(array)),) + array.shape[1:], dtype=array.dtype)
+    grown[:len(array)] = array
+    return grown
+
+
+class AgreementStats:
+    def __init__(self):
+        self.unit_index, self.units = {}, []     # unit key → id, id → (lang, role) group id
+        self.unit_groups = np.zeros(0, dtype=np.int64)
+        self.group_index, self.groups = {}, []   # (lang, role) → id
+        self.verdict_counts = np.zeros((0, len(VERDICTS)), dtype=np.int32)
+        self.confidence_counts = np.zeros((0, CONFIDENCE_LEVELS), dtype=np.int32)
+        self.raters = []                          # unit id → {session: (verdict, level or -1, timestamp)}
+        self.ratings = 0
+
+        self.verdict_coincidence = np.zeros((0, len(VERDICTS), len(VERDICTS)))
+        self.confidence_coincidence = np.zeros((0, CONFIDENCE_LEVELS, CONFIDENCE_LEVELS))
+        self.fleiss_p = np.zeros(0)
+        self.fleiss_units = np.zeros(0)
+        self.fleiss_totals = np.zeros((0, len(VERDICTS)))
+        self.pairs = {}                           # (group, a, b) → [shared, agreed], a < b
+        self.sources = {}                         # watermark, see read_new
+
+    def _unit(self, key, lang):
+        uid = self.unit_index.get(key)
+        if uid is None:
+            group = (lang, key[2])
+            gid = self.group_index.get(group)
+            if gid is None:
+                gid = self.group_index[group] = len(self.groups)
+                self.groups.append(group)
+            uid = self.unit_index[key] = len(self.units)
+            self.units.append(gid)
+            self.raters.append({})
+        return uid
+
+    def _contribute(self, uids, sign):
+        gids = self.unit_groups[uids]
+        np.add.at(self.verdict_coincidence, gids, sign * coincidences(self.verdict_counts[uids]))
+        np.add.at(self.confidence_coincidence, gids, sign * coincidences(self.confidence_counts[uids]))
+        p, units, totals = fleiss_terms(self.verdict_counts[uids])
+        np.add.at(self.fleiss_p, gids, sign * p)
+        np.add.at(self.fleiss_units, gids, sign * units)
+        np.add.at(self.fleiss_totals, gids, sign * totals)
+
+    def _pair(self, gid, a, b, agreed, sign):
+        pair = self.pairs.setdefault((gid, min(a, b), max(a, b)), [0, 0])
+        pair[0] += sign
+        pair[1] += sign * agreed
+
+    def update(self, responses):
+        # `responses` as returned by analytics.load_responses. A session's
+        # latest rating of a unit (by timestamp) replaces its earlier ones,
+        # so feeding rows again, or out of order, changes nothing.
+        verdict_ids = {v: i for i, v in enumerate(VERDICTS)}
+        frame = responses[JOIN_KEY + ["lang", "session_name", "makes_sense", "confidence", "timestamp"]]
+        frame = frame[frame["makes_sense"].isin(VERDICTS)]
+        if frame.empty:
+            return 0
+        seen = len(self.units)
+        keys = list(zip(*(frame[c].astype(object).to_numpy() for c in JOIN_KEY)))
+        langs = frame["lang"].astype(object).to_numpy()
+        # Units are numbered in row order, so reports list them as they came.
+        uids = np.fromiter((self._unit(k, l) for k, l in zip(keys, langs)), dtype=np.int64, count=len(keys))
+        # Within the batch only a session's latest rating of a unit counts.
+        timestamps = frame["timestamp"].astype(object)
+        order = timestamps.where(timestamps.notna(), "").to_numpy().argsort(kind="stable")
+        frame, uids = frame.iloc[order], uids[order]
+        pairs = pd.DataFrame({"uid": uids, "session": frame["session_name"].astype(object).to_numpy()})
+        latest = ~pairs.duplicated(keep="last").to_numpy()
+        frame, uids = frame[latest], uids[latest]
+
+        n_units, n_groups = len(self.units), len(self.groups)
+        self.unit_groups = _grow(self.unit_groups, n_units)
+        self.unit_groups[seen:n_units] = self.units[seen:]
+        self.verdict_counts = _grow(self.verdict_counts, n_units)
+        self.confidence_counts = _grow(self.confidence_counts, n_units)
+        for name in ("verdict_coincidence", "confidence_coincidence", "fleiss_p", "fleiss_units", "fleiss_totals"):
+            setattr(self, name, _grow(getattr(self, name), n_groups))
+
+        sessions = frame["session_name"].astype(object).to_numpy()
+        verdicts = frame["makes_sense"].astype(object).map(verdict_ids).to_numpy(dtype=np.int64)
+        confidence = pd.to_numeric(frame["confidence"], errors="coerce").to_numpy()
+        valid = (confidence >= 1) & (confidence <= CONFIDENCE_LEVELS)
+        levels = np.where(valid, np.nan_to_num(confidence) - 1, -1).astype(np.int64)
+        stamps = frame["timestamp"].astype(object).where(frame["timestamp"].notna(), "").to_numpy()
+
+        # Only the rater dicts and evaluator pairs need a Python loop; the
+        # count changes it collects are applied with np.add.at below.
+        keep = np.ones(len(uids), dtype=bool)
+        old_verdicts = np.full(len(uids), -1, dtype=np.int64)
+        old_levels = np.full(len(uids), -1, dtype=np.int64)
+        for i, (uid, session, verdict, ts) in enumerate(zip(uids.tolist(), sessions, verdicts.tolist(), stamps)):
+            raters, gid = self.raters[uid], self.units[uid]
+            old = raters.get(session)
+            if old is not None:
+                if ts < old[2]:
+                    keep[i] = False
+                    continue
+                old_verdicts[i], old_levels[i] = old[0], old[1]
+                del raters[session]
+                for other, (v, _, _) in raters.items():
+                    self._pair(gid, session, other, v == old[0], -1)
+            for other, (v, _, _) in raters.items():
+                self._pair(gid, session, other, v == verdict, +1)
+            raters[session] = (verdict, int(levels[i]), ts)
+
+        touched = np.unique(uids[keep])
+        self._contribute(touched, -1.0)
+        replaced = keep & (old_verdicts >= 0)
+        self.ratings += int(keep.sum() - replaced.sum())
+        np.add.at(self.verdict_counts, (uids[replaced], old_verdicts[replaced]), -1)
+        had_level = replaced & (old_levels >= 0)
+        np.add.at(self.confidence_counts, (uids[had_level], old_levels[had_level]), -1)
+        np.add.at(self.verdict_counts, (uids[keep], verdicts[keep]), 1)
+        has_level = keep & (levels >= 0)
+        np.add.at(self.confidence_counts, (uids[has_level], levels[has_level]), 1)
+        self._contribute(touched, +1.0)
+        return int(keep.sum())
+
+    def refresh(self, paths=None, db=RESPONSE_DB, archive_dir=ARCHIVE_DIR):
+        # Reads only what is new since the last refresh (see read_new).
+        frames, unknown, self.sources = read_new(self.sources, paths, db, archive_dir)
+        added = self.update(pd.concat(frames, ignore_index=True)) if frames else 0
+        return added, unknown
+
+    # ——— Reports ———
+    def _buckets(self, by):
+        # Group id → output bucket for `by` ⊆ ("lang", "predicted_role").
+        fields = {"lang": 0, "predicted_role": 1}
+        labels = [tuple(group[fields[f]] for f in by) for group in self.groups]
+        index = {label: i for i, label in enumerate(dict.fromkeys(labels))}
+        return list(index), np.array([index[label] for label in labels], dtype=np.int64)
+
+    def summary(self, by=("lang", "predicted_role")):
+        by = list(by)
+        labels, buckets = self._buckets(by)
+        n = len(labels)
+        n_groups = len(self.groups)
+
+        def total(array):
+            out = np.zeros((n,) + array.shape[1:])
+            np.add.at(out, buckets, array[:n_groups])
+            return out
+
+        unit_groups = self.unit_groups[:len(self.units)]
+        units = total(np.bincount(unit_groups, minlength=n_groups).astype(np.float64))
+        ratings = total(np.bincount(unit_groups, weights=self.verdict_counts[:len(unit_groups)].sum(axis=1),
+                                    minlength=n_groups))
+        verdict_c, confidence_c = total(self.verdict_coincidence), total(self.confidence_coincidence)
+        fleiss_p, fleiss_units, fleiss_totals = total(self.fleiss_p), total(self.fleiss_units), total(self.fleiss_totals)
+
+        rows = []
+        for i, label in enumerate(labels):
+            rows.append(dict(zip(by, label)) | {
+                "units": int(units[i]),
+                "ratings": int(ratings[i]),
+                "pairable_units": int(fleiss_units[i]),
+                "fleiss_kappa": fleiss_kappa(fleiss_p[i], fleiss_units[i], fleiss_totals[i]),
+                "alpha_nominal": krippendorff_alpha(verdict_c[i]),
+                "alpha_confidence": krippendorff_alpha(confidence_c[i], ordinal_delta),
+            })
+        columns = by + ["units", "ratings", "pairable_units", "fleiss_kappa", "alpha_nominal", "alpha_confidence"]
+        return pd.DataFrame(rows, columns=columns).round(4)
+
+    def pairwise(self, lang=None, role=None):
+        # Long format: one row per evaluator pair with shared units.
+        totals = {}
+        for (gid, a, b), (shared, agreed) in self.pairs.items():
+            g_lang, g_role = self.groups[gid]
+            if shared == 0 or (lang is not None and g_lang != lang) or (role is not None and g_role != role):
+                continue
+            pair = totals.setdefault((a, b), [0, 0])
+            pair[0] += shared
+            pair[1] += agreed
+        frame = pd.DataFrame(
+            [(a, b, shared, agreed / shared) for (a, b), (shared, agreed) in totals.items()],
+            columns=["annotator_a", "annotator_b", "shared_units", "agreement"],
+        )
+        return frame.sort_values(["annotator_a", "annotator_b"], ignore_index=True).round(4)
+
+    def pairwise_matrix(self, lang=None, role=None):
+        pairs = self.pairwise(lang, role)
+        both = pd.concat([
+            pairs,
+            pairs.rename(columns={"annotator_a": "annotator_b", "annotator_b": "annotator_a"}),
+        ])
+        return both.pivot(index="annotator_a", columns="annotator_b", values="agreement")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inter-annotator agreement on the predicted labels.")
+    parser.add_argument("files", nargs="*", help="response CSV files (default: responses/*.csv)")
+    parser.add_argument("--db", default=RESPONSE_DB, help="response store to include ('' to skip)")
+    parser.add_argument("--archive", default=ARCHIVE_DIR, help="response archive to include ('' to skip)")
+    parser.add_argument("--out", default=ANALYTICS_DIR)
+    parser.add_argument("--rebuild", action="store_true", help="ignore the saved statistics and start over")
+    args = parser.parse_args()
+
+    os.makedirs(args.out, exist_ok=True)
+    state_path = os.path.join(args.out, STATE_FILE)
+    stats = (None if args.rebuild else load_state(state_path)) or AgreementStats()
+    added, skipped = stats.refresh(args.files or None, args.db, args.archive)
+    for path in skipped:
+        print(f"⚠️ {path}: unrecognized response schema, skipped")
+    save_state(stats, state_path)
+    print(f"{added} new ratings, {stats.ratings} in total")
+
+    tables = {
+        "overall": stats.summary(by=()),
+        "by_lang": stats.summary(by=("lang",)),
+        "by_role": stats.summary(by=("predicted_role",)),
+        "by_lang_role": stats.summary(),
+    }
+    pairs = [stats.pairwise(lang).assign(lang=lang) for lang in dict.fromkeys(g[0] for g in stats.groups)]
+    tables["pairwise"] = pd.concat(pairs, ignore_index=True) if pairs else stats.pairwise()
+    for name, table in tables.items():
+        path = os.path.join(args.out, f"agreement_{name}.csv")
+        table.to_csv(path, index=False)
+        print(f"✅ {name} → {path}")
+    print()
+    print(tables["by_lang"].to_string(index=False))
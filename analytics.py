@@ -0,0 +1,176 @@
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+from archive import ARCHIVE_DIR, DEDUP_KEY, RESPONSE_COLUMNS, RESPONSE_GLOB, pending, read_archive
+from dataset import load_dataset
+from store import RESPONSE_DB
+
+# ─── Offline Response Analytics ────────────────────────────────────
+# Loads every response (the archive, per-language and downloaded session
+# CSVs, the response store), joins each judgment to the label it was about by
+# (article_id, entity_mention, predicted_role) and aggregates per language,
+# per fine role and per language × role.
+
+ANALYTICS_DIR = "analytics"
+JOIN_KEY = ["article_id", "entity_mention", "predicted_role"]
+
+# Unsure counts as half an acceptance.
+VERDICT_VALUES = {"Yes": 1.0, "No": 0.0, "Unsure": 0.5}
+
+
+# ─── Loading ───────────────────────────────────────────────────────
+def load_responses(paths=None, db=RESPONSE_DB, archive_dir=ARCHIVE_DIR):
+    # Returns the per-label responses from the archive plus whatever has not
+    # been compacted into it yet, deduplicated, and the paths whose schema
+    # is not recognized. Per-entity rows are migrated (see archive.py).
+    frames, _, unknown, _ = pending(paths, db, archive_dir)
+    archived = read_archive(archive_dir) if archive_dir else None
+    if archived is not None and len(archived):
+        frames.insert(0, archived)
+    frames = [frame.reindex(columns=RESPONSE_COLUMNS) for frame in frames]
+
+    if not frames:
+        return pd.DataFrame(columns=RESPONSE_COLUMNS), unknown
+    responses = pd.concat(frames, ignore_index=True)
+    # The store and its CSV export hold the same rows.
+    responses = responses.drop_duplicates(DEDUP_KEY, ignore_index=True)
+    responses["confidence"] = pd.to_numeric(responses["confidence"], errors="coerce")
+    for col in ("lang", "predicted_role", "makes_sense", "session_name"):
+        responses[col] = responses[col].astype("category")
+    return responses, unknown
+
+
+# ─── Label Table ───────────────────────────────────────────────────
+# One row per (entity, selected label) of predicted_fine_margin, with the
+# model score for that role and whether it is a gold label. Entities that
+# share article_id and mention (different spans) are indistinguishable in
+# the responses; the first one stands for them.
+def label_table(dataset):
+    rows, role_ids = np.nonzero(np.asarray(dataset.label_rank) > 0)
+    entities = dataset.entities
+    labels = pd.DataFrame({
+        "article_id": entities["article_id"].to_numpy()[rows],
+        "entity_mention": entities["entity_mention"].to_numpy()[rows],
+        "predicted_role": np.asarray(dataset.fine_roles, dtype=object)[role_ids],
+        "lang": entities["lang"].to_numpy()[rows],
+        "row": rows,
+        "role_id": role_ids,
+        "rank": np.asarray(dataset.label_rank)[rows, role_ids],
+        "score": np.asarray(dataset.scores)[rows, role_ids],
+        "gold": np.asarray(dataset.y_true)[rows, role_ids],
+    })
+    return labels.drop_duplicates(JOIN_KEY, ignore_index=True)
+
+
+def join_labels(responses, labels):
+    # Judgments that match no label (e.g. from an older dataset) get row -1.
+    joined = responses.merge(
+        labels.drop(columns=["lang"]), how="left", on=JOIN_KEY, validate="many_to_one"
+    )
+    joined["row"] = joined["row"].fillna(-1).astype(np.int64)
+    joined["verdict"] = joined["makes_sense"].astype(object).map(VERDICT_VALUES).astype(np.float64)
+    return joined
+
+
+# ─── Aggregation ───────────────────────────────────────────────────
+# Per group:
+#   judgments / labels      – judged label rows / distinct labels judged
+#   acceptance              – share of Yes verdicts
+#   unsure                  – share of Unsure verdicts
+#   weighted_acceptance     – verdict value averaged with confidence weights
+#   precision               – share of labels whose weighted verdict is > 0.5
+#   gold_precision          – share of judged labels that are gold labels
+#   mean_score              – mean model score of the judged labels
+def label_verdicts(joined):
+    judged = joined[(joined["row"] >= 0) & joined["verdict"].notna()].copy()
+    weight = judged["confidence"].fillna(1.0).to_numpy(np.float64)
+    judged["yes"] = (judged["verdict"] == 1.0).to_numpy(np.float64)
+    judged["unsure"] = (judged["verdict"] == 0.5).to_numpy(np.float64)
+    judged["weight"] = weight
+    judged["weighted"] = weight * judged["verdict"].to_numpy()
+
+    per_label = judged.groupby(JOIN_KEY, observed=True, sort=False).agg(
+        lang=("lang", "first"),
+        judgments=("verdict", "size"),
+        yes=("yes", "sum"),
+        unsure=("unsure", "sum"),
+        weight=("weight", "sum"),
+        weighted=("weighted", "sum"),
+        score=("score", "first"),
+        gold=("gold", "first"),
+    ).reset_index()
+    per_label["weighted_acceptance"] = per_label["weighted"] / per_label["weight"]
+    per_label["accepted"] = per_label["weighted_acceptance"] > 0.5
+    return per_label
+
+
+def summarize(per_label, by):
+    grouped = per_label.groupby(by, observed=True)
+    summary = grouped.agg(
+        labels=("accepted", "size"),
+        judgments=("judgments", "sum"),
+        yes=("yes", "sum"),
+        unsure=("unsure", "sum"),
+        weight=("weight", "sum"),
+        weighted=("weighted", "sum"),
+        accepted=("accepted", "sum"),
+        gold=("gold", "sum"),
+        mean_score=("score", "mean"),
+    )
+    out = pd.DataFrame({
+        "judgments": summary["judgments"],
+        "labels": summary["labels"],
+        "acceptance": summary["yes"] / summary["judgments"],
+        "unsure": summary["unsure"] / summary["judgments"],
+        "weighted_acceptance": summary["weighted"] / summary["weight"],
+        "precision": summary["accepted"] / summary["labels"],
+        "gold_precision": summary["gold"] / summary["labels"],
+        "mean_score": summary["mean_score"],
+    })
+    return out.round(4).reset_index()
+
+
+def summary_tables(per_label):
+    per_label = per_label.assign(all="all")
+    return {
+        "overall": summarize(per_label, ["all"]).drop(columns=["all"]),
+        "by_lang": summarize(per_label, ["lang"]),
+        "by_role": summarize(per_label, ["predicted_role"]),
+        "by_lang_role": summarize(per_label, ["lang", "predicted_role"]),
+    }
+
+
+def write_tables(tables, out_dir=ANALYTICS_DIR):
+    os.makedirs(out_dir, exist_ok=True)
+    written = {}
+    for name, table in tables.items():
+        path = os.path.join(out_dir, f"summary_{name}.csv")
+        table.to_csv(path, index=False)
+        written[name] = path
+    return written
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Summarize human judgments of the predicted labels.")
+    parser.add_argument("files", nargs="*", help=f"response CSV files (default: {RESPONSE_GLOB})")
+    parser.add_argument("--db", default=RESPONSE_DB, help="response store to include ('' to skip)")
+    parser.add_argument("--archive", default=ARCHIVE_DIR, help="response archive to include ('' to skip)")
+    parser.add_argument("--out", default=ANALYTICS_DIR)
+    args = parser.parse_args()
+
+    responses, skipped = load_responses(args.files or None, args.db, args.archive)
+    for path in skipped:
+        print(f"⚠️ {path}: unrecognized response schema, skipped")
+    joined = join_labels(responses, label_table(load_dataset()))
+    unmatched = int((joined["row"] < 0).sum())
+    if unmatched:
+        print(f"⚠️ {unmatched} judgments match no label in the current dataset")
+
+    tables = summary_tables(label_verdicts(joined))
+    for name, path in write_tables(tables, args.out).items():
+        print(f"✅ {name} → {path}")
+    print()
+    print(tables["by_lang"].to_string(index=False))
@@ -0,0 +1,262 @@
+import argparse
+import ast
+import csv
+import glob
+import io
+import json
+import os
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from store import COLUMNS, RESPONSE_DB, ResponseStore
+
+# ─── Response Schemas ──────────────────────────────────────────────
+# Version 1: one row per entity, written by the old form (eval copy.py):
+#   predicted_roles holds every label of the entity, and makes_sense,
+#   issues, multi_labels and confidence answer for all of them.
+# Version 2: one row per predicted label, written by eval.py and the
+#   response store (label_index, total_labels, predicted_role, segment;
+#   eval.py's CSVs spell the segment column "segement"). plan_id and
+#   entity_key were added later; rows written before them have none, and
+#   auto-assigned rows have no plan_id.
+# Everything is migrated to version 2 under the store's column names.
+# Version 1 rows keep issues/multi_labels and are copied to each label.
+
+SCHEMA_VERSION = 2
+RESPONSE_GLOB = "responses/*.csv"
+ARCHIVE_DIR = "responses/archive"
+ARCHIVE_MANIFEST = "manifest.json"
+
+RESPONSE_COLUMNS = [col for col, _ in COLUMNS]
+RENAMES = {key: col for col, key in COLUMNS if key != col}
+# One judgment of one label; whole-article submissions share a timestamp.
+DEDUP_KEY = ["session_name", "timestamp", "article_id", "entity_mention", "predicted_role"]
+
+ARCHIVE_SCHEMA = pa.schema([
+    ("session_name", pa.string()),
+    ("timestamp", pa.string()),
+    ("segment", pa.int32()),
+    ("plan_id", pa.string()),
+    ("article_id", pa.string()),
+    ("entity_key", pa.string()),
+    ("lang", pa.string()),
+    ("entity_mention", pa.string()),
+    ("main_role", pa.string()),
+    ("predicted_role", pa.string()),
+    ("label_index", pa.int16()),
+    ("total_labels", pa.int16()),
+    ("makes_sense", pa.string()),
+    ("confidence", pa.int8()),
+    ("issues", pa.string()),
+    ("multi_labels", pa.string()),
+    ("schema_version", pa.int8()),
+])
+ARCHIVE_COLUMNS = ARCHIVE_SCHEMA.names
+STRING_COLUMNS = [f.name for f in ARCHIVE_SCHEMA if pa.types.is_string(f.type)]
+
+
+def schema_version(header):
+    header = [RENAMES.get(name, name) for name in header]
+    if "predicted_role" in header:
+        return 2
+    if "predicted_roles" in header:
+        return 1
+    return None
+
+
+# ─── Migration ─────────────────────────────────────────────────────
+def _legacy_roles(value):
+    # "{'A', 'B'}" (str of a set), "('A',)" or "A, B"; kept in written order.
+    text = "" if value is None or value != value else str(value).strip()
+    try:
+        parsed = ast.literal_eval(text)
+    except (ValueError, SyntaxError):
+        parsed = text.split(",")
+    if isinstance(parsed, str):
+        parsed = [parsed]
+    roles = [str(r).strip() for r in parsed if str(r).strip()]
+    return sorted(dict.fromkeys(roles), key=text.find)
+
+
+def migrate_v1(frame):
+    frame = frame.reset_index(drop=True)
+    roles = frame["predicted_roles"].map(_legacy_roles)
+    # explode keeps the source row as the index, which numbers the labels.
+    frame = frame.assign(predicted_role=roles, total_labels=roles.map(len)).explode("predicted_role")
+    frame = frame[frame["predicted_role"].notna()]
+    frame["label_index"] = frame.groupby(level=0).cumcount() + 1
+    return frame.drop(columns=["predicted_roles"]).reset_index(drop=True).assign(schema_version=1)
+
+
+def migrate_v2(frame):
+    return frame.rename(columns=RENAMES).assign(schema_version=2)
+
+
+def normalize(frame):
+    # Any mix of migrated rows → archive column order and dtypes.
+    frame = frame.reindex(columns=ARCHIVE_COLUMNS)
+    for col in STRING_COLUMNS:
+        frame[col] = frame[col].astype(object).where(frame[col].notna(), None)
+    for field in ARCHIVE_SCHEMA:
+        if not pa.types.is_string(field.type):
+            frame[field.name] = pd.to_numeric(frame[field.name], errors="coerce")
+    return frame
+
+
+MIGRATIONS = {1: migrate_v1, 2: migrate_v2}
+
+
+# ─── Fragments ─────────────────────────────────────────────────────
+# Session downloads are small files, so files with the same header are
+# concatenated and parsed in one read_csv call rather than one per file.
+def read_header(path):
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        return next(csv.reader(f), None)
+
+
+def _read_group(header, paths):
+    buf = io.StringIO()
+    csv.writer(buf, lineterminator="\n").writerow(header)
+    for path in paths:
+        with open(path, "r", encoding="utf-8", newline="") as f:
+            f.readline()
+            body = f.read()
+        buf.write(body)
+        if body and not body.endswith("\n"):
+            buf.write("\n")
+    buf.seek(0)
+    return pd.read_csv(buf, dtype=str, keep_default_na=False)
+
+
+def read_fragments(paths):
+    # Returns the rows of every response CSV migrated to the current
+    # schema, and the paths whose schema is not recognized.
+    groups, unknown = {}, []
+    for path in paths:
+        header = read_header(path)
+        if header is None:
+            continue
+        version = schema_version(header)
+        if version is None:
+            unknown.append(path)
+            continue
+        groups.setdefault((version, tuple(header)), []).append(path)
+
+    frames = []
+    for (version, header), group in groups.items():
+        frame = _read_group(list(header), group)
+        if len(frame):
+            frames.append(normalize(MIGRATIONS[version](frame)))
+    return frames, unknown
+
+
+def fingerprint(path):
+    stat = os.stat(path)
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+# ─── Archive ───────────────────────────────────────────────────────
+# responses/archive/<lang>/<date>.parquet, zstd-compressed, one file per
+# language and day of submission. The manifest records which fragments
+# (by size and mtime) and which store rows are already in it, so
+# compaction and readers only look at what is new.
+def read_manifest(archive_dir=ARCHIVE_DIR):
+    path = os.path.join(archive_dir, ARCHIVE_MANIFEST)
+    if not os.path.exists(path):
+        return None
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def _write_manifest(manifest, archive_dir):
+    path = os.path.join(archive_dir, ARCHIVE_MANIFEST)
+    with open(path + ".tmp", "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(path + ".tmp", path)
+
+
+def partition_path(archive_dir, lang, date):
+    return os.path.join(archive_dir, lang, f"{date}.parquet")
+
+
+def _dates(frame):
+    dates = frame["timestamp"].fillna("").str.slice(0, 10)
+    return dates.where(dates.str.match(r"\d{4}-\d{2}-\d{2}$"), "undated")
+
+
+def read_archive(archive_dir=ARCHIVE_DIR, lang=None):
+    pattern = os.path.join(archive_dir, lang or "*", "*.parquet")
+    tables = [pq.read_table(path, schema=ARCHIVE_SCHEMA) for path in sorted(glob.glob(pattern))]
+    if not tables:
+        return ARCHIVE_SCHEMA.empty_table().to_pandas()
+    return pa.concat_tables(tables).to_pandas()
+
+
+def pending(paths=None, db=RESPONSE_DB, archive_dir=ARCHIVE_DIR):
+    # Fragments and store rows not yet compacted into the archive.
+    manifest = (read_manifest(archive_dir) if archive_dir else None) or {}
+    compacted = manifest.get("fragments", {})
+    paths = sorted(glob.glob(RESPONSE_GLOB)) if paths is None else paths
+    paths = [p for p in paths if compacted.get(os.path.abspath(p)) != fingerprint(p)]
+    frames, unknown = read_fragments(paths)
+
+    store_id = 0
+    if db and os.path.exists(db):
+        store = manifest.get("store", {})
+        after = store.get("last_id", 0) if store.get("path") == os.path.abspath(db) else 0
+        rows = ResponseStore(db).read_frame(after_id=after)
+        store_id = int(rows["id"].max()) if len(rows) else after
+        if len(rows):
+            frames.append(normalize(migrate_v2(rows.drop(columns=["id"]))))
+    return frames, paths, unknown, store_id
+
+
+def compact(paths=None, db=RESPONSE_DB, archive_dir=ARCHIVE_DIR):
+    frames, paths, unknown, store_id = pending(paths, db, archive_dir)
+    manifest = read_manifest(archive_dir) or {"fragments": {}, "store": {}, "partitions": {}}
+    manifest["schema_version"] = SCHEMA_VERSION
+    written = {}
+
+    if frames:
+        new = pd.concat(frames, ignore_index=True)
+        new["lang"] = new["lang"].fillna("unknown")
+        for (lang, date), part in new.groupby([new["lang"], _dates(new)], sort=True):
+            path = partition_path(archive_dir, lang, date)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            if os.path.exists(path):
+                part = pd.concat([pq.read_table(path, schema=ARCHIVE_SCHEMA).to_pandas(), part], ignore_index=True)
+            # The earliest copy of a judgment wins; fragments often overlap.
+            part = part.drop_duplicates(DEDUP_KEY, ignore_index=True)
+            part = part.sort_values("timestamp", kind="stable", ignore_index=True)
+            table = pa.Table.from_pandas(part, schema=ARCHIVE_SCHEMA, preserve_index=False)
+            pq.write_table(table, path + ".tmp", compression="zstd")
+            os.replace(path + ".tmp", path)
+            manifest["partitions"][f"{lang}/{date}"] = len(part)
+            written[path] = len(part)
+
+    os.makedirs(archive_dir, exist_ok=True)
+    for path in paths:
+        if path not in unknown:
+            manifest["fragments"][os.path.abspath(path)] = fingerprint(path)
+    if db and os.path.exists(db):
+        manifest["store"] = {"path": os.path.abspath(db), "last_id": store_id}
+    _write_manifest(manifest, archive_dir)
+    return written, unknown
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compact response CSVs and the response store into the archive.")
+    parser.add_argument("files", nargs="*", help=f"response CSV files (default: {RESPONSE_GLOB})")
+    parser.add_argument("--db", default=RESPONSE_DB, help="response store to include ('' to skip)")
+    parser.add_argument("--out", default=ARCHIVE_DIR)
+    args = parser.parse_args()
+
+    written, unknown = compact(args.files or None, args.db, args.out)
+    for path in unknown:
+        print(f"⚠️ {path}: unrecognized response schema, skipped")
+    for path, rows in written.items():
+        print(f"✅ {path} ({rows} rows)")
+    if not written:
+        print("Nothing new to compact.")
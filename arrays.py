@@ -0,0 +1,10 @@
+# ─── Shared Arrays ─────────────────────────────────────────────────
+# Arrays built once and then shared by every session of the server process
+# (dataset rows, segment plans, the taxonomy index) are frozen, so a session
+# that writes into one fails instead of changing it for everyone. Kept in its
+# own module because taxonomy.py is imported by dataset.py.
+
+
+def readonly(array):
+    array.setflags(write=False)
+    return array
@@ -0,0 +1,286 @@
+import argparse
+import json
+import os
+import platform
+import resource
+import shutil
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+# ─── Rerun Benchmark ───────────────────────────────────────────────
+# Drives eval.py headlessly through Streamlit's AppTest harness over
+# synthetic copies of combined_all.csv scaled 1×, 10×, 100×, ... Each scale
+# gets its own working directory under bench/<scale>x/ (CSV, taxonomy.json,
+# store, response database), so nothing in the repo is touched.
+#
+# Per scale:
+#   build       – converting the CSV and writing the startup snapshot
+#   cold start  – a fresh process: first paint of the name prompt, then the
+#                 first entity page (which waits for the warm start)
+#   per language and segment – the rerun that selects it, idle reruns,
+#                 submits and "Continue" clicks, and the peak RSS reached
+#                 while doing so
+# Cold start and the segment walk run in a child process per scale, so the
+# imports and the st.cache_resource state are really cold.
+#
+# Results go to bench/results/<commit>.json; `--compare` puts two side by side.
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+BENCH_DIR = os.path.join(REPO_DIR, "bench")
+RESULTS_DIR = os.path.join(BENCH_DIR, "results")
+APP = os.path.join(REPO_DIR, "eval.py")
+SCALES = [1, 10, 100]
+SUBMITS = 3
+IDLE_RERUNS = 3
+APP_TIMEOUT = 300
+SESSION_NAME = "bench"
+
+
+# ─── Synthetic Data ────────────────────────────────────────────────
+# `scale` copies of every article and its entities; copy i > 0 gets the
+# article ID "<stem>~<i><ext>", so segments grow the way real data would.
+def synthetic_csv(source, scale, path):
+    import pandas as pd
+
+    df = pd.read_csv(source, encoding="utf-8")
+    stem_ext = df["article_id"].str.extract(r"^(.*?)(\.[^.]*)?$").fillna("")
+    parts = [df]
+    for i in range(1, scale):
+        parts.append(df.assign(article_id=stem_ext[0] + f"~{i}" + stem_ext[1]))
+    pd.concat(parts, ignore_index=True).to_csv(path, index=False, encoding="utf-8")
+    return len(df) * scale
+
+
+def prepare(scale, workdir):
+    if os.path.exists(workdir):
+        shutil.rmtree(workdir)
+    os.makedirs(workdir)
+    n_entities = synthetic_csv(os.path.join(REPO_DIR, "combined_all.csv"), scale,
+                               os.path.join(workdir, "combined_all.csv"))
+    shutil.copy(os.path.join(REPO_DIR, "taxonomy.json"), workdir)
+    start = time.perf_counter()
+    subprocess.run([sys.executable, os.path.join(REPO_DIR, "snapshot.py")], cwd=workdir, check=True,
+                   stdout=subprocess.DEVNULL)
+    return {"scale": scale, "entities": n_entities, "build_s": time.perf_counter() - start}
+
+
+# ─── Memory ────────────────────────────────────────────────────────
+# Peak RSS per step: writing 5 to /proc/self/clear_refs resets VmHWM. Where
+# that is not allowed the peak is the process-lifetime maximum.
+def _status(field):
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith(field + ":"):
+                return int(line.split()[1]) / 1024
+    return None
+
+
+def reset_peak():
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def peak_rss_mib():
+    peak = _status("VmHWM")
+    return peak if peak is not None else resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+# ─── Driving the App ───────────────────────────────────────────────
+def timed(action):
+    start = time.perf_counter()
+    at = action()
+    elapsed = time.perf_counter() - start
+    if at.exception:
+        raise RuntimeError(at.exception[0].message)
+    return elapsed
+
+
+def button(at, label):
+    matches = [b for b in at.button if label in b.label]
+    return matches[0] if matches else None
+
+
+def stats(samples):
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    return {
+        "n": len(ordered),
+        "median_s": statistics.median(ordered),
+        "p95_s": ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))],
+        "max_s": ordered[-1],
+    }
+
+
+def walk_segment(at, submits, idle_reruns):
+    reruns = [timed(at.run) for _ in range(idle_reruns)]
+    submit, cont = [], []
+    for _ in range(submits):
+        form_submit = button(at, "Submit")
+        if form_submit is None:
+            break  # segment finished
+        submit.append(timed(form_submit.click().run))
+        cont.append(timed(button(at, "Continue").click().run))
+    return {"rerun": stats(reruns), "submit": stats(submit), "continue": stats(cont)}
+
+
+def run_app(workdir, submits, idle_reruns):
+    # Runs in the child process; `workdir` is the app's working directory.
+    os.chdir(workdir)
+    sys.path.insert(0, REPO_DIR)
+    start = time.perf_counter()
+    from streamlit.testing.v1 import AppTest
+    imports = time.perf_counter() - start
+
+    at = AppTest.from_file(APP, default_timeout=APP_TIMEOUT)
+    first_paint = timed(at.run)
+    first_entity = timed(at.text_input[0].input(SESSION_NAME).run)
+    cold = {
+        "streamlit_import_s": imports,
+        "first_paint_s": first_paint,
+        "first_entity_s": first_entity,
+        "rss_mib": _status("VmRSS"),
+    }
+
+    from dataset import read_manifest
+    segments, peak_scope = [], "step" if reset_peak() else "process"
+    for lang in read_manifest()["languages"]:
+        switch = timed(at.selectbox(key="lang").select(lang).run)
+        for label in at.selectbox(key="segment_label").options:
+            reset_peak()
+            select = timed(at.selectbox(key="segment_label").select(label).run)
+            progress = at.get("progress")[0].proto.text
+            result = walk_segment(at, submits, idle_reruns)
+            segments.append({
+                "lang": lang,
+                "segment": label,
+                "entities": int(progress.split("/")[1].split()[0]),
+                "switch_lang_s": switch,
+                "select_s": select,
+                **result,
+                "peak_rss_mib": peak_rss_mib(),
+            })
+            switch = None
+    return {"cold_start": cold, "segments": segments, "peak_scope": peak_scope}
+
+
+# ─── Results ───────────────────────────────────────────────────────
+def _version(module):
+    try:
+        return __import__(module).__version__
+    except ImportError:
+        return None
+
+
+def environment():
+    def git(*args):
+        out = subprocess.run(["git", *args], cwd=REPO_DIR, capture_output=True, text=True)
+        return out.stdout.strip() if out.returncode == 0 else None
+
+    return {
+        "commit": git("rev-parse", "--short", "HEAD"),
+        "dirty": bool(git("status", "--porcelain", "--untracked-files=no")),
+        "date": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "versions": {m: _version(m) for m in ("streamlit", "pandas", "pyarrow", "numpy")},
+    }
+
+
+def summarize(scale_result):
+    segments = scale_result["segments"]
+
+    def median_of(step):
+        samples = [s[step]["median_s"] for s in segments if s[step]]
+        return statistics.median(samples) if samples else None
+
+    return {
+        "first_paint_s": scale_result["cold_start"]["first_paint_s"],
+        "first_entity_s": scale_result["cold_start"]["first_entity_s"],
+        "rerun_s": median_of("rerun"),
+        "submit_s": median_of("submit"),
+        "continue_s": median_of("continue"),
+        "peak_rss_mib": max(s["peak_rss_mib"] for s in segments),
+    }
+
+
+def compare(old_path, new_path):
+    with open(old_path) as f:
+        old = json.load(f)
+    with open(new_path) as f:
+        new = json.load(f)
+    print(f"{old['environment']['commit']} → {new['environment']['commit']}")
+    old_scales = {r["scale"]: r for r in old["scales"]}
+    for result in new["scales"]:
+        before = old_scales.get(result["scale"])
+        if before is None:
+            continue
+        print(f"{result['scale']}× ({result['entities']} entities)")
+        for key, value in result["summary"].items():
+            was = before["summary"].get(key)
+            if value is None or not was:
+                continue
+            print(f"  {key:<16} {was:10.4f} → {value:10.4f}  ({value / was:.2f}×)")
+
+
+def _fmt(seconds):
+    return f"{seconds * 1000:.0f} ms" if seconds is not None else "–"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Headless cold-start, rerun, submit and memory benchmark of eval.py.")
+    parser.add_argument("--scales", type=int, nargs="+", default=SCALES)
+    parser.add_argument("--submits", type=int, default=SUBMITS, help="submits per segment")
+    parser.add_argument("--reruns", type=int, default=IDLE_RERUNS, help="idle reruns per segment")
+    parser.add_argument("--out", help="results JSON (default: bench/results/<commit>.json)")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="compare two results files")
+    parser.add_argument("--child", nargs=2, metavar=("WORKDIR", "OUT"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        sys.exit()
+
+    if args.child:
+        workdir, out = args.child
+        result = run_app(workdir, args.submits, args.reruns)
+        with open(out, "w") as f:
+            json.dump(result, f)
+        sys.exit()
+
+    env = environment()
+    results = []
+    for scale in args.scales:
+        workdir = os.path.join(BENCH_DIR, f"{scale}x")
+        result = prepare(scale, workdir)
+        child_out = os.path.join(workdir, "result.json")
+        # Streamlit logs to stderr on every run; it is only shown on failure.
+        child = subprocess.run([sys.executable, os.path.abspath(__file__), "--child", workdir, child_out,
+                                "--submits", str(args.submits), "--reruns", str(args.reruns)],
+                               stderr=subprocess.PIPE, text=True)
+        if child.returncode:
+            sys.exit(f"❌ {scale}×: the app run failed\n{child.stderr[-4000:]}")
+        with open(child_out) as f:
+            result |= json.load(f)
+        result["summary"] = summarize(result)
+        results.append(result)
+        s = result["summary"]
+        print(f"✅ {scale}× ({result['entities']} entities): build {result['build_s']:.1f} s, "
+              f"first paint {_fmt(s['first_paint_s'])}, first entity {_fmt(s['first_entity_s'])}, "
+              f"rerun {_fmt(s['rerun_s'])}, submit {_fmt(s['submit_s'])}, "
+              f"peak {s['peak_rss_mib']:.0f} MiB")
+
+    out = args.out or os.path.join(RESULTS_DIR, f"{env['commit'] or 'unknown'}{'-dirty' if env['dirty'] else ''}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    params = {"scales": args.scales, "submits": args.submits, "reruns": args.reruns}
+    with open(out, "w") as f:
+        json.dump({"environment": env, "params": params, "scales": results}, f, indent=2)
+    print(f"→ {out}")
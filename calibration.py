@@ -0,0 +1,165 @@
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+from analytics import ANALYTICS_DIR, join_labels, label_table, load_responses
+from archive import ARCHIVE_DIR
+from dataset import load_dataset
+from store import RESPONSE_DB
+
+# ─── Calibration ───────────────────────────────────────────────────
+# How well the per-role model scores (predicted_roles) predict that a label
+# is right, judged two ways:
+#   human – each Yes/No verdict on a shown label (Unsure is left out)
+#   gold  – y_true for every scored (entity, role) cell
+# predicted_fine_margin keeps the roles whose score is within a margin of
+# the entity's top score. The sweep shows what a different cutoff, either
+# on that margin or on the score itself, would keep. Human verdicts exist
+# only for labels that were shown, so a looser cutoff can only be judged
+# against gold.
+
+N_BINS = 10
+SCORE_THRESHOLDS = np.round(np.linspace(0.0, 1.0, 41), 3)
+MARGIN_THRESHOLDS = np.round(np.linspace(0.0, 0.25, 51), 3)
+
+
+# ─── Observations ──────────────────────────────────────────────────
+def human_observations(joined):
+    judged = joined[(joined["row"] >= 0) & joined["verdict"].isin([0.0, 1.0])]
+    return pd.DataFrame({
+        "lang": judged["lang"].astype(object).to_numpy(),
+        "row": judged["row"].to_numpy(),
+        "score": judged["score"].to_numpy(np.float64),
+        "outcome": judged["verdict"].to_numpy(np.float64),
+    })
+
+
+def gold_observations(dataset):
+    scores = np.asarray(dataset.scores, dtype=np.float64)
+    rows, roles = np.nonzero(scores > 0)
+    return pd.DataFrame({
+        "lang": dataset.entities["lang"].to_numpy()[rows],
+        "row": rows,
+        "score": scores[rows, roles],
+        "outcome": np.asarray(dataset.y_true)[rows, roles].astype(np.float64),
+    })
+
+
+def with_margins(observations, dataset):
+    # margin: distance below the entity's top score (0 for the top role).
+    top = np.asarray(dataset.scores, dtype=np.float64).max(axis=1)
+    return observations.assign(margin=top[observations["row"].to_numpy()] - observations["score"].to_numpy())
+
+
+# ─── Reliability ───────────────────────────────────────────────────
+def reliability(scores, outcomes, n_bins=N_BINS):
+    bins = np.minimum((scores * n_bins).astype(np.int64), n_bins - 1)
+    count = np.bincount(bins, minlength=n_bins)
+    score_sum = np.bincount(bins, weights=scores, minlength=n_bins)
+    outcome_sum = np.bincount(bins, weights=outcomes, minlength=n_bins)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        curve = pd.DataFrame({
+            "bin": np.arange(n_bins),
+            "lo": np.arange(n_bins) / n_bins,
+            "hi": np.arange(1, n_bins + 1) / n_bins,
+            "count": count,
+            "mean_score": score_sum / count,
+            "observed": outcome_sum / count,
+        })
+    n = max(len(scores), 1)
+    ece = np.nansum(count / n * np.abs(curve["observed"] - curve["mean_score"]))
+    brier = float(np.mean((scores - outcomes) ** 2)) if len(scores) else np.nan
+    return curve, ece, brier
+
+
+# ─── Threshold Sweep ───────────────────────────────────────────────
+# Everything with key <= threshold is kept. One sort plus cumulative sums
+# answers all thresholds at once.
+def cumulative_at(keys, weights, thresholds):
+    order = np.argsort(keys, kind="stable")
+    idx = np.searchsorted(keys[order], thresholds, side="right")
+    return {
+        name: np.concatenate([[0.0], np.cumsum(w[order])])[idx]
+        for name, w in weights.items()
+    }
+
+
+def sweep(observations, kind, thresholds, n_entities):
+    # kind "margin": keep labels within `threshold` of the top score;
+    # kind "score": keep labels scoring at least `threshold`. The top role
+    # is always kept so every entity has a label.
+    margin = observations["margin"].to_numpy()
+    if kind == "margin":
+        keys, limits = margin, thresholds
+    else:
+        keys = np.where(margin == 0, -np.inf, -observations["score"].to_numpy())
+        limits = -thresholds
+    outcome = observations["outcome"].to_numpy()
+    kept = cumulative_at(keys, {"kept": np.ones_like(outcome), "positive": outcome}, limits)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return pd.DataFrame({
+            "kind": kind,
+            "threshold": thresholds,
+            "kept": kept["kept"].astype(np.int64),
+            "labels_per_entity": kept["kept"] / n_entities,
+            "precision": kept["positive"] / kept["kept"],
+            "recall": kept["positive"] / outcome.sum(),
+        })
+
+
+# ─── Report ────────────────────────────────────────────────────────
+def calibration_report(dataset, joined):
+    sources = {
+        "human": with_margins(human_observations(joined), dataset),
+        "gold": with_margins(gold_observations(dataset), dataset),
+    }
+    curves, summary, sweeps = [], [], []
+    for target, observations in sources.items():
+        groups = [("all", observations)] + list(observations.groupby("lang", sort=False))
+        for lang, obs in groups:
+            if obs.empty:
+                continue
+            scores, outcomes = obs["score"].to_numpy(), obs["outcome"].to_numpy()
+            curve, ece, brier = reliability(scores, outcomes)
+            curves.append(curve.assign(target=target, lang=lang))
+            summary.append({"target": target, "lang": lang, "n": len(obs), "base_rate": outcomes.mean(),
+                            "mean_score": scores.mean(), "ece": ece, "brier": brier})
+            # Human observations are judgments, not labels, so only gold
+            # gives a labels-per-entity figure.
+            n_entities = obs["row"].nunique() if target == "gold" else np.nan
+            for kind, thresholds in (("score", SCORE_THRESHOLDS), ("margin", MARGIN_THRESHOLDS)):
+                sweeps.append(sweep(obs, kind, thresholds, n_entities).assign(target=target, lang=lang))
+
+    front = ["target", "lang"]
+    tables = {
+        "summary": pd.DataFrame(summary),
+        "reliability": pd.concat(curves, ignore_index=True),
+        "sweep": pd.concat(sweeps, ignore_index=True),
+    }
+    return {
+        name: table[front + [c for c in table.columns if c not in front]].round(4)
+        for name, table in tables.items()
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Calibration of the role scores against human verdicts and gold labels.")
+    parser.add_argument("files", nargs="*", help="response CSV files (default: responses/*.csv)")
+    parser.add_argument("--db", default=RESPONSE_DB, help="response store to include ('' to skip)")
+    parser.add_argument("--archive", default=ARCHIVE_DIR, help="response archive to include ('' to skip)")
+    parser.add_argument("--out", default=ANALYTICS_DIR)
+    args = parser.parse_args()
+
+    dataset = load_dataset()
+    responses, _ = load_responses(args.files or None, args.db, args.archive)
+    tables = calibration_report(dataset, join_labels(responses, label_table(dataset)))
+
+    os.makedirs(args.out, exist_ok=True)
+    for name, table in tables.items():
+        path = os.path.join(args.out, f"calibration_{name}.csv")
+        table.to_csv(path, index=False)
+        print(f"✅ {name} → {path}")
+    print()
+    print(tables["summary"].to_string(index=False))
@@ -0,0 +1,391 @@
+import argparse
+import contextlib
+import fcntl
+import hashlib
+import json
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from arrays import readonly
+from preprocess import span_issues, validate_spans, write_report
+from render import CONTEXT_WINDOW
+from taxonomy import TAXONOMY_JSON, load_taxonomy
+
+# ─── Normalized Article / Entity Store ─────────────────────────────
+# combined_all.csv repeats the full article text on every entity row.
+# The store splits it into two Arrow IPC files that are memory-mapped
+# on load:
+#   data/articles.arrow  – one row per article (article_id, lang, text)
+#   data/entities.arrow  – one row per entity, text replaced by article_idx
+# Entities are sorted by article so each article's entities are contiguous.
+#
+# The label columns are decoded once into n_entities × n_fine_roles .npy
+# matrices whose columns follow the fine role order of taxonomy.json:
+#   y_true.npy      – gold labels (bool), from y_true_vec
+#   y_pred.npy      – predicted labels (bool), from y_pred_vec
+#   scores.npy      – model score per role (float32), from predicted_roles
+#   label_rank.npy  – 1-based position of each role in predicted_fine_margin,
+#                     0 where the role was not selected (int8)
+# Entity spans are validated and repaired while converting (preprocess.py),
+# so text[start_offset:end_offset] is the mention for every entity whose
+# span could be resolved; the findings go to span_report.json.
+#
+# The store is keyed on the hashes of the CSV and taxonomy.json. Prediction
+# batches ingested later (see ingest.py) are listed in the manifest, and
+# each one moves `version` to a hash of the previous version and the batch.
+
+SOURCE_CSV = "combined_all.csv"
+STORE_DIR = "data"
+FORMAT_VERSION = 6
+
+ARTICLES_FILE = "articles.arrow"
+ENTITIES_FILE = "entities.arrow"
+MANIFEST_FILE = "manifest.json"
+SPAN_REPORT_FILE = "span_report.json"
+LOCK_FILE = ".lock"
+MATRIX_FILES = {
+    "y_true": "y_true.npy",
+    "y_pred": "y_pred.npy",
+    "scores": "scores.npy",
+    "label_rank": "label_rank.npy",
+}
+
+# Keys repeated on every row are dictionary-encoded, so they load as pandas
+# categoricals: one small integer per row instead of one string per row.
+ARTICLE_SCHEMA = pa.schema([
+    ("article_id", pa.string()),
+    ("lang", pa.dictionary(pa.int8(), pa.string())),
+    ("text", pa.large_string()),
+])
+ENTITY_SCHEMA = pa.schema([
+    ("article_id", pa.dictionary(pa.int32(), pa.string())),
+    ("article_idx", pa.int32()),
+    ("entity_mention", pa.string()),
+    ("start_offset", pa.int32()),
+    ("end_offset", pa.int32()),
+    ("p_main_role", pa.dictionary(pa.int8(), pa.string())),
+    ("fine_grained_roles", pa.string()),
+    ("lang", pa.dictionary(pa.int8(), pa.string())),
+    ("context", pa.large_string()),
+    ("correct", pa.bool_()),
+    ("context_start", pa.int32()),
+])
+DICTIONARY_COLUMNS = [f.name for f in ENTITY_SCHEMA if pa.types.is_dictionary(f.type)]
+# What Dataset.entities loads. Gold roles live in y_true and `correct` is
+# not used by the app; `context` stays in the mapped table (entity_context)
+# and article_id is rebuilt from article_idx.
+ENTITY_COLUMNS = ["article_idx", "entity_mention", "start_offset", "end_offset",
+                  "p_main_role", "lang", "context_start"]
+
+
+def file_hash(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _write_table(df, path, schema=None):
+    if schema is not None:
+        df = df[schema.names]
+    table = pa.Table.from_pandas(df, schema=schema, preserve_index=False)
+    # An IPC file allows one dictionary per column.
+    table = table.unify_dictionaries().combine_chunks()
+    tmp = f"{path}.tmp"
+    with pa.OSFile(tmp, "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(tmp, path)
+
+
+def _read_table(path):
+    # Arrow IPC files are read straight out of the mapped pages, no copy.
+    return pa.ipc.open_file(pa.memory_map(path, "r")).read_all()
+
+
+def _write_json(obj, path):
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(obj, f, indent=2)
+    os.replace(tmp, path)
+
+
+def _write_npy(array, path):
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        np.save(f, array)
+    os.replace(tmp, path)
+
+
+# Writers (conversion, ingestion) hold the lock exclusively and readers
+# share it, so a Dataset is never built from files of two versions.
+@contextlib.contextmanager
+def store_lock(store_dir=STORE_DIR, exclusive=False):
+    os.makedirs(store_dir, exist_ok=True)
+    with open(os.path.join(store_dir, LOCK_FILE), "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def read_manifest(store_dir=STORE_DIR):
+    path = os.path.join(store_dir, MANIFEST_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def store_version(store_dir=STORE_DIR):
+    # Cheap enough to call on every rerun; None until the store exists.
+    manifest = read_manifest(store_dir)
+    return manifest and manifest["version"]
+
+
+# ─── Label Decoding ────────────────────────────────────────────────
+def decode_vectors(series, n_roles):
+    # "[0. 0. 1. ...]" strings → one float parse over the concatenated text.
+    flat = np.fromstring(" ".join(series.str.strip("[]")), sep=" ")
+    if flat.size != len(series) * n_roles:
+        raise ValueError(f"{series.name}: expected {n_roles} values per row")
+    return flat.reshape(len(series), n_roles).astype(bool)
+
+
+def _role_columns(names, role_ids, column):
+    cols = names.map(role_ids)
+    if cols.isna().any():
+        unknown = sorted(set(names[cols.isna()]))
+        raise ValueError(f"{column}: roles not in taxonomy: {unknown}")
+    return cols.to_numpy(dtype=np.intp)
+
+
+def decode_scores(series, role_ids):
+    # "{'Deceiver': 0.2864, 'Corrupt': 0.2372, ...}" → dense score matrix.
+    pairs = series.str.extractall(r"'([^']+)'\s*:\s*([-+0-9.eE]+)")
+    scores = np.zeros((len(series), len(role_ids)), dtype=np.float32)
+    rows = pairs.index.get_level_values(0).to_numpy()
+    scores[rows, _role_columns(pairs[0], role_ids, series.name)] = pairs[1].astype(np.float32).to_numpy()
+    return scores
+
+
+def decode_label_ranks(series, role_ids):
+    # "{'Deceiver', 'Corrupt'}" → 1-based literal position per role.
+    names = series.str.extractall(r"'([^']+)'")
+    ranks = np.zeros((len(series), len(role_ids)), dtype=np.int8)
+    rows = names.index.get_level_values(0).to_numpy()
+    ranks[rows, _role_columns(names[0], role_ids, series.name)] = names.index.get_level_values(1).to_numpy() + 1
+    return ranks
+
+
+def role_ids_from_ranks(ranks):
+    # Selected fine role IDs per row, in predicted_fine_margin order. Rows
+    # with the same ranks share one tuple; there are few distinct ones.
+    ranks = np.ascontiguousarray(ranks)
+    # Each row as one opaque value, far cheaper to unique than axis=0.
+    rows = ranks.view(np.dtype((np.void, ranks.shape[1] * ranks.itemsize))).reshape(-1)
+    _, first, inverse = np.unique(rows, return_index=True, return_inverse=True)
+    unique = ranks[first]
+    order = np.argsort(np.where(unique > 0, unique, np.iinfo(np.int8).max), axis=1, kind="stable")
+    counts = (unique > 0).sum(axis=1)
+    combos = [tuple(o[:c].tolist()) for o, c in zip(order, counts)]
+    return [combos[i] for i in inverse.reshape(-1)]
+
+
+# ─── CSV → Store Converter ─────────────────────────────────────────
+def sort_by_article(articles, entities):
+    # Articles ordered by ID, entities grouped by article in their original
+    # order. Returns the permutation applied to the entity rows.
+    articles = articles.sort_values("article_id", kind="stable").reset_index(drop=True)
+    article_idx = pd.Index(articles["article_id"]).get_indexer(entities["article_id"]).astype(np.int32)
+    order = np.argsort(article_idx, kind="stable")
+    entities = entities.assign(article_idx=article_idx).iloc[order].reset_index(drop=True)
+    return articles, entities, order
+
+
+def write_store(store_dir, articles, entities, matrices, manifest):
+    os.makedirs(store_dir, exist_ok=True)
+    _write_table(articles, os.path.join(store_dir, ARTICLES_FILE), ARTICLE_SCHEMA)
+    _write_table(entities, os.path.join(store_dir, ENTITIES_FILE), ENTITY_SCHEMA)
+    for name, array in matrices.items():
+        _write_npy(array, os.path.join(store_dir, MATRIX_FILES[name]))
+    manifest = manifest | {"n_articles": len(articles), "n_entities": len(entities)}
+    # Manifest goes last: a half-written store never looks current.
+    _write_json(manifest, os.path.join(store_dir, MANIFEST_FILE))
+    return manifest
+
+
+def convert_csv(csv_path=SOURCE_CSV, store_dir=STORE_DIR, taxonomy_path=TAXONOMY_JSON):
+    df = pd.read_csv(csv_path, encoding="utf-8")
+    taxonomy = load_taxonomy(taxonomy_path)
+
+    spans, span_report = validate_spans(df, dict(zip(df["article_id"], df["text"])))
+    issues = span_issues(df, spans)
+    df["start_offset"], df["end_offset"] = spans["start_offset"], spans["end_offset"]
+    fine_roles = taxonomy.fine_roles
+    role_ids = taxonomy.fine_id
+
+    entities = df.drop(columns=["text"])
+    entities.insert(1, "article_idx", np.int32(0))
+    # Where the `context` snippet starts in the article text (-1 if it is not
+    # a verbatim slice), so windowed rendering can use it in place of the text.
+    entities["context_start"] = np.array([
+        text.find(context, max(0, start - CONTEXT_WINDOW))
+        for text, context, start in zip(df["text"], df["context"], df["start_offset"])
+    ], dtype=np.int32)
+    entities["start_offset"] = entities["start_offset"].astype(np.int32)
+    entities["end_offset"] = entities["end_offset"].astype(np.int32)
+    articles, entities, _ = sort_by_article(df.drop_duplicates("article_id")[["article_id", "lang", "text"]], entities)
+
+    matrices = {
+        "y_true": decode_vectors(entities["y_true_vec"], len(fine_roles)),
+        "y_pred": decode_vectors(entities["y_pred_vec"], len(fine_roles)),
+        "scores": decode_scores(entities["predicted_roles"], role_ids),
+        "label_rank": decode_label_ranks(entities["predicted_fine_margin"], role_ids),
+    }
+    entities = entities.drop(columns=["y_true_vec", "y_pred_vec", "predicted_roles", "predicted_fine_margin"])
+
+    os.makedirs(store_dir, exist_ok=True)
+    write_report(span_report, issues, os.path.join(store_dir, SPAN_REPORT_FILE))
+
+    source_sha256 = file_hash(csv_path)
+    manifest = {
+        "format": FORMAT_VERSION,
+        "source": os.path.basename(csv_path),
+        "source_sha256": source_sha256,
+        "taxonomy_sha256": file_hash(taxonomy_path),
+        "version": source_sha256[:12],
+        "fine_roles": fine_roles,
+        # First-seen order in the CSV, used for the language picker.
+        "languages": df["lang"].unique().tolist(),
+        "spans": span_report,
+        "batches": [],
+    }
+    return write_store(store_dir, articles, entities, matrices, manifest)
+
+
+def is_current(csv_path=SOURCE_CSV, store_dir=STORE_DIR, taxonomy_path=TAXONOMY_JSON):
+    manifest = read_manifest(store_dir)
+    return (
+        manifest is not None
+        and manifest.get("format") == FORMAT_VERSION
+        and manifest.get("source_sha256") == file_hash(csv_path)
+        and manifest.get("taxonomy_sha256") == file_hash(taxonomy_path)
+    )
+
+
+# ─── Loaded Dataset ────────────────────────────────────────────────
+class StoreVersionError(RuntimeError):
+    pass
+
+
+def entity_keys(entities):
+    # Stable identity of an entity span across dataset versions. Plain
+    # Python strings, so key_rows and lang_keys can share them.
+    columns = (entities[c] for c in ("article_id", "start_offset", "end_offset", "entity_mention"))
+    keys = [f"{a}#{s}-{e}#{m}" for a, s, e, m in zip(*columns)]
+    return pd.Series(keys, index=entities.index, dtype=object)
+
+
+# One instance is shared by every session of the server process, so nothing
+# here is mutated after __init__. Sessions hold row index arrays into
+# `entities` rather than copies of it.
+class Dataset:
+    def __init__(self, store_dir=STORE_DIR):
+        self.store_dir = store_dir
+        self.manifest = read_manifest(store_dir)
+        self.version = self.manifest["version"]
+        self._map_store()
+        self.article_ids = self.articles.column("article_id").to_pylist()
+        self._article_lookup = {aid: i for i, aid in enumerate(self.article_ids)}
+        self.article_lengths = readonly(
+            pc.utf8_length(self.articles.column("text")).to_numpy().astype(np.int32)
+        )
+
+        self.fine_roles = self.manifest["fine_roles"]
+        entities = self.entity_table.select(ENTITY_COLUMNS).to_pandas()
+        # Shares the strings of article_ids; decoding the stored dictionary
+        # would build a second copy of every ID.
+        entities.insert(0, "article_id", pd.Categorical.from_codes(
+            entities["article_idx"].to_numpy(), categories=pd.Index(self.article_ids, dtype=object)
+        ))
+        # Predicted roles as fine role IDs (see taxonomy.py) and as names.
+        role_ids = role_ids_from_ranks(self.label_rank)
+        names = {ids: tuple(self.fine_roles[i] for i in ids) for ids in set(role_ids)}
+        entities["predicted_role_ids"] = pd.Series(role_ids, dtype=object)
+        entities["predicted_fine_margin"] = pd.Series([names[ids] for ids in role_ids], dtype=object)
+        entities["entity_key"] = entity_keys(entities)
+        self.entities = entities
+        keys = entities["entity_key"].to_numpy()
+        # Rows with an identical span share a key; the first one stands for it.
+        self.key_rows = dict(zip(keys[::-1], range(len(keys) - 1, -1, -1)))
+
+        self.languages = self.manifest["languages"]
+        # Compared on the categorical codes; -2 matches nothing (NaN is -1).
+        lang_codes = entities["lang"].cat.codes.to_numpy()
+        lang_code = {lang: i for i, lang in enumerate(entities["lang"].cat.categories)}
+        self.lang_rows = {
+            lang: readonly(np.flatnonzero(lang_codes == lang_code.get(lang, -2)))
+            for lang in self.languages
+        }
+        self.lang_keys = {lang: list(dict.fromkeys(keys[rows])) for lang, rows in self.lang_rows.items()}
+
+    def _map_store(self):
+        self.articles = _read_table(os.path.join(self.store_dir, ARTICLES_FILE))
+        self.entity_table = _read_table(os.path.join(self.store_dir, ENTITIES_FILE))
+        # Label matrices are memory-mapped read-only.
+        for name, filename in MATRIX_FILES.items():
+            setattr(self, name, np.load(os.path.join(self.store_dir, filename), mmap_mode="r"))
+
+    # Pickled (see snapshot.py) without the mapped files; they are mapped
+    # again on load, so the store must still be at the same version.
+    # Callers hold store_lock, so the manifest matches the files mapped.
+    def __getstate__(self):
+        mapped = {"articles", "entity_table", *MATRIX_FILES}
+        return {k: v for k, v in self.__dict__.items() if k not in mapped}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        manifest = read_manifest(self.store_dir)
+        current = manifest and manifest["version"]
+        if current != self.version:
+            raise StoreVersionError(f"pickled at version {self.version}, store is at {current}")
+        self._map_store()
+
+    def article_index(self, article_id):
+        return self._article_lookup[article_id]
+
+    def article_text(self, article_idx):
+        return self.articles.column("text")[article_idx].as_py()
+
+    def entity_context(self, row):
+        return self.entity_table.column("context")[int(row)].as_py()
+
+
+def load_dataset(csv_path=SOURCE_CSV, store_dir=STORE_DIR, ingest=True):
+    with store_lock(store_dir, exclusive=True):
+        if not is_current(csv_path, store_dir):
+            convert_csv(csv_path, store_dir)
+    if ingest:
+        # Also re-applies every batch after a rebuild from the CSV. Imported
+        # here because ingest.py builds on this module.
+        from ingest import ingest_pending
+        ingest_pending(store_dir=store_dir)
+    with store_lock(store_dir):
+        return Dataset(store_dir)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert combined_all.csv into the normalized article/entity store.")
+    parser.add_argument("csv", nargs="?", default=SOURCE_CSV)
+    parser.add_argument("--out", default=STORE_DIR)
+    args = parser.parse_args()
+
+    manifest = convert_csv(args.csv, args.out)
+    print(f"✅ {manifest['n_articles']} articles, {manifest['n_entities']} entities → {args.out}/ (version {manifest['version']})")
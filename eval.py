@@ -1,11 +1,11 @@
 import streamlit as st
-import pandas as pd
-import os
-import ast
 import html
-import json
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
+from render import (CONTEXT_WINDOW, Prefetcher, RenderCache, article_job,
+                    render_article, render_role_cards, role_cards_job)
+
 # ─── Page Setup ─────────────────────────────────────────────────────
 st.set_page_config(page_title="Franx Evaluation", layout="wide")
 
@@ -22,6 +22,16 @@ st.markdown("""
   display: inline-block;
   box-shadow: 0 1px 2px rgba(0,0,0,0.2);
 }
+.role-card summary {
+  cursor: pointer;
+  margin: 2px 0 8px 0;
+}
+.role-card p {
+  margin: 4px 0 4px 12px;
+}
+.context-gap {
+  color: #9ca3af;
+}
 .entity-label {
   background-color: #0073e6; 
   color: #ffffff;
@@ -35,86 +45,25 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
-# ─── Load & Cache Data ─────────────────────────────────────────────
-@st.cache_data
-def load_data():
-    df = pd.read_csv("combined_all.csv", encoding="utf-8")
-    df["predicted_fine_margin"] = df["predicted_fine_margin"].apply(ast.literal_eval)
-    return df
-
-@st.cache_data
-def load_taxonomy():
-    with open("taxonomy.json", "r") as f:
-        return json.load(f)
-
-df = load_data()
-taxonomy_data = load_taxonomy()
-
-# ─── Taxonomy Mapping ──────────────────────────────────────────────
-fine_role_info = {
-    entry["fine_role"]: {
-        "description": entry["description"],
-        "example": entry["example"],
-        "coarse_role": entry["coarse_role"]
-    }
-    for entry in taxonomy_data
-}
-
-# ─── Highlight Function ─────────────────────────────────────────────
-def highlight_entities(text, records, label_column,
-                       default_color="#facc15", compare_column=None):
-    out, last = [], 0
-    records = sorted(records, key=lambda r: r["start_offset"])
-    for ent in records:
-        s, e = ent["start_offset"], ent["end_offset"]+1
-        mention = html.escape(text[s:e])
-        labels = ent[label_column]
-        label_str = ", ".join(labels)
-        bg = default_color
-        if compare_column:
-            is_match = set(labels) == set(ent[compare_column])
-            bg = "#96f1b3" if is_match else "#d87575"
-            other = ", ".join(ent[compare_column])
-            label_str = f"pred: {label_str} ⇄ gold: {other}"
-        out.append(html.escape(text[last:s]))
-        out.append(
-            f"<span class='entity' style='background:{bg}'>{mention}</span>"
-            f"<span class='entity-label'>{html.escape(label_str)}</span>"
-        )
-        last = e
-    out.append(html.escape(text[last:]))
-    return "".join(out)
-
-# ─── Role Display Function ─────────────────────────────────────────
-def display_role_info(role_list, title):
-    st.markdown(f"**{title}**")
-    for role in role_list:
-        info = fine_role_info.get(role, {})
-        st.markdown(
-            f"<span style='background:#e0e0e0;padding:4px 8px;border-radius:5px;margin:3px;display:inline-block;'>{html.escape(role)}</span>",
-            unsafe_allow_html=True
-        )
-        with st.expander(f"📘 {role}"):
-            st.markdown(f"**Coarse Role**: `{info.get('coarse_role', 'N/A')}`")
-            st.markdown(f"**Description:** {info.get('description', 'No description available.')}")
-            st.markdown(f"**Example:** _{info.get('example', 'No example available.')}_")
-
+# ─── Warm Start ────────────────────────────────────────────────────
+# Nothing up to the name prompt needs the data, so a fresh process paints
+# the prompt first while pandas/pyarrow are imported and the startup
+# snapshot (see snapshot.py) is loaded on a background thread.
+SEGMENT_METHOD = "balanced"
+SEGMENT_COST_MODEL = "minutes"
 
+def _warm_start():
+    from snapshot import load_startup
+    return load_startup(SEGMENT_METHOD, SEGMENT_COST_MODEL)
 
+@st.cache_resource
+def warm_start():
+    executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="warm-start")
+    future = executor.submit(_warm_start)
+    executor.shutdown(wait=False)
+    return future
 
-# ─── Session Setup ─────────────────────────────────────────────────
-if "article_index" not in st.session_state:
-    st.session_state.article_index = 0
-if "entity_index" not in st.session_state:
-    st.session_state.entity_index = 0
-if "lang" not in st.session_state:
-    st.session_state.lang = df["lang"].unique()[0]
-if "responses" not in st.session_state:
-    st.session_state.responses = []
-if "just_submitted" not in st.session_state:
-    st.session_state.just_submitted = False
-if "last_response" not in st.session_state:
-    st.session_state.last_response = None
+warm_start()
 
 # ─── Instructions ──────────────────────────────────────────────────
 with st.expander("📘 Instructions for Evaluators", expanded=False):
@@ -132,6 +81,7 @@ with st.expander("📘 Instructions for Evaluators", expanded=False):
     - **pt** – Portuguese
                 
     Also select a segment from the language. Each segment has a subset of articles and entities. 
+    Alternatively, tick **Auto-assign entities** to be handed entities from a shared queue, so evaluators don't overlap.
 
     ##### 3. 📄 Review the Article Carefully
     Pay attention to:
@@ -164,125 +114,214 @@ session_name = st.text_input("", value="", placeholder="e.g. John")
 if not session_name:
     st.stop()
 
+# ─── Load & Cache Data ─────────────────────────────────────────────
+# Imported only now, behind the name prompt (see Warm Start above).
+from dataset import store_version
+from leases import LeaseService
+from priority import Prioritizer
+from segments import LANGUAGE_SEGMENTS, build_plan, save_plan
+from session_buffer import ExportBuffer
+from snapshot import load_startup
+from store import ResponseStore, ResponseWriter
+
+# One read-only Dataset per server process; sessions share it without copying.
+# Keyed on the store version, so batches ingested by `python ingest.py` are
+# picked up on the next rerun; the previous version stays cached for
+# sessions that are mid-rerun. The warm start covers the first version.
+@st.cache_resource(max_entries=2)
+def load_data(version):
+    warm = warm_start()
+    if warm.exception() is None and warm.result().version == version:
+        return warm.result()
+    return load_startup(SEGMENT_METHOD, SEGMENT_COST_MODEL)
+
+# ─── Response Writer ───────────────────────────────────────────────
+# Submissions are queued to one background writer per process, so submit
+# never waits on disk. Rows are committed every WRITER_FLUSH_INTERVAL
+# seconds or WRITER_BATCH_SIZE rows.
+WRITER_FLUSH_INTERVAL = 0.5
+WRITER_BATCH_SIZE = 200
+
+@st.cache_resource
+def load_response_writer():
+    return ResponseWriter(ResponseStore(), WRITER_FLUSH_INTERVAL, WRITER_BATCH_SIZE)
+
+# ─── Work Leases ───────────────────────────────────────────────────
+# With auto-assign on, entities come from a shared queue in the response
+# database instead of a hand-picked segment. A lease lasts LEASE_SECONDS
+# (renewed on every rerun) and entities are served until
+# JUDGMENTS_PER_ENTITY evaluators have stored a judgment of them.
+LEASE_SECONDS = 15 * 60
+JUDGMENTS_PER_ENTITY = 3
+
+@st.cache_resource
+def load_lease_service():
+    return LeaseService(lease_seconds=LEASE_SECONDS, target=JUDGMENTS_PER_ENTITY)
+
+# Auto-assigned entities are served most-uncertain first (see priority.py).
+@st.cache_resource(max_entries=2)
+def load_prioritizer(_dataset, version):
+    return Prioritizer(_dataset)
+
+# Highlighted article HTML, shared by all sessions.
+@st.cache_resource
+def load_render_cache():
+    return RenderCache()
+
+@st.cache_resource
+def load_prefetcher(_cache):
+    return Prefetcher(_cache)
+
+startup = load_data(store_version())
+dataset = startup.dataset
+df = dataset.entities
+# Role IDs and pre-rendered role cards, built once per process.
+taxonomy = startup.taxonomy
+render_cache = load_render_cache()
+prefetcher = load_prefetcher(render_cache)
+response_writer = load_response_writer()
+lease_service = load_lease_service()
+
+# ─── Role Display Function ─────────────────────────────────────────
+def display_role_info(role_ids, title):
+    st.markdown(f"**{title}**")
+    st.markdown(render_role_cards(render_cache, taxonomy, role_ids), unsafe_allow_html=True)
+
+
+
+
+# ─── Session Setup ─────────────────────────────────────────────────
+if "entity_position" not in st.session_state:
+    st.session_state.entity_position = 0
+if "lang" not in st.session_state:
+    st.session_state.lang = dataset.languages[0]
+if "export_buffer" not in st.session_state:
+    st.session_state.export_buffer = ExportBuffer()
+if "just_submitted" not in st.session_state:
+    st.session_state.just_submitted = False
+if "last_response" not in st.session_state:
+    st.session_state.last_response = None
+if "lease" not in st.session_state:
+    st.session_state.lease = None
+
+
+# ——— Report submissions the background writer could not save ———
+for rows, error in response_writer.take_failures(session_name):
+    st.error(
+        f"⚠️ Your response for **{html.escape(rows[0]['entity_mention'])}** could not be saved ({error}). "
+        "It is still included in your downloadable CSV — please send that file to the project team."
+    )
+
 # ─── Sidebar Language Picker ───────────────────────────────────────
 st.sidebar.title("🔧 Settings")
-st.sidebar.selectbox("🌍 Select Language", df["lang"].unique(), key="lang")
+st.sidebar.selectbox("🌍 Select Language", dataset.languages, key="lang")
+
+def release_lease():
+    if st.session_state.lease is not None:
+        lease_service.release(st.session_state.lease["id"])
+        st.session_state.lease = None
+        st.session_state.just_submitted = False
+        st.session_state.last_response = None
+
+st.sidebar.checkbox("🤝 Auto-assign entities", key="auto_assign", on_change=release_lease,
+                    help="Get entities from a shared queue, most uncertain predictions first, so evaluators don't overlap.")
+auto_assign = st.session_state.auto_assign
 
 # ─── Handle Language Switch ─────────────────────────────────────────
 if "previous_lang" not in st.session_state:
     st.session_state.previous_lang = st.session_state.lang
 
 if st.session_state.lang != st.session_state.previous_lang:
-    st.session_state.article_index = 0
-    st.session_state.entity_index = 0
+    release_lease()
+    st.session_state.entity_position = 0
     st.session_state.previous_lang = st.session_state.lang
     st.rerun()
 
 # ─── Article & Entity Setup ─────────────────────────────────────────
-lang_df = df[df["lang"] == st.session_state.lang].reset_index(drop=True)
-grouped = lang_df.groupby("article_id")
-article_ids = list(grouped.groups.keys())
-
-# ——— Add this after loading and filtering the language-specific DataFrame ———
-lang_df = df[df["lang"] == st.session_state.lang].reset_index(drop=True)
-grouped = lang_df.groupby("article_id")
-article_ids = list(grouped.groups.keys())
-
-# ——— Define number of segments per language ———
-language_segments = {
-    "bg": 1,   # 10 articles, 14 entities
-    "pt": 1,   # low annotator coverage
-    "hi": 5,   # 142 entities → ~28 per segment
-    "ru": 3,   # 45 entities → ~15 per segment
-    "en": 4,   # 58 entities → ~14-15 per segment
-}
-
-NUM_SEGMENTS = language_segments.get(st.session_state.lang, 1)
-
-# Compute total number of entities for the selected language
-total_entities = len(lang_df)
-entities_per_segment = total_entities // NUM_SEGMENTS + (total_entities % NUM_SEGMENTS > 0)
-
-# Compute total number of entities per article
-article_entity_counts = lang_df.groupby("article_id").size().reset_index(name="entity_count")
-article_entity_counts = article_entity_counts.sort_values("article_id")
-
-# Group articles into segments
-segments = []
-current_segment = []
-current_count = 0
-
-for _, row in article_entity_counts.iterrows():
-    article_id = row["article_id"]
-    count = row["entity_count"]
-    if current_count + count > entities_per_segment and current_segment:
-        segments.append(current_segment)
-        current_segment = []
-        current_count = 0
-    current_segment.append(article_id)
-    current_count += count
-if current_segment:
-    segments.append(current_segment)
+# The plan depends only on (dataset version, lang, segment count), so it is
+# built once per process and every rerun just indexes into it. Segments are
+# balanced on estimated annotation minutes (see segments.py) and each plan is
+# saved under data/plans/ with its plan ID. Default plans come with the
+# startup snapshot.
+@st.cache_resource
+def load_segment_plan(_startup, version, lang, num_segments, method, cost_model):
+    plan = _startup.plans.get((lang, num_segments, method, cost_model))
+    if plan is None:
+        plan = build_plan(_startup.dataset, lang, num_segments, method, cost_model)
+        save_plan(plan)
+    return plan
+
+NUM_SEGMENTS = LANGUAGE_SEGMENTS.get(st.session_state.lang, 1)
+plan = load_segment_plan(startup, dataset.version, st.session_state.lang, NUM_SEGMENTS,
+                         SEGMENT_METHOD, SEGMENT_COST_MODEL)
 
 # ——— Add segment selector to sidebar ———
 if "segment_index" not in st.session_state:
     st.session_state.segment_index = 0
 
-segment_labels = [f"Segment {i+1}" for i in range(len(segments))]
-st.sidebar.selectbox("📚 Select Segment", segment_labels, key="segment_label")
+segment_labels = plan.labels
+if "segment_label" not in st.session_state or st.session_state.segment_label not in segment_labels:
+    st.session_state.segment_label = segment_labels[0]
+# Rendered (disabled) under auto-assign too: Streamlit drops the state of
+# keyed widgets that are not rendered, which would lose the evaluator's place.
+st.sidebar.selectbox("📚 Select Segment", segment_labels, key="segment_label", disabled=auto_assign)
+if not auto_assign:
+    st.sidebar.caption(f"Segment plan `{plan.plan_id}`")
 st.session_state.segment_index = segment_labels.index(st.session_state.segment_label)
-segment_id = st.session_state.segment_index + 1
+# Auto-assigned responses are recorded with segment 0 and no plan ID: the
+# entity comes from the lease queue, not from a segment of the plan.
+segment_id = 0 if auto_assign else st.session_state.segment_index + 1
+plan_id = None if auto_assign else plan.plan_id
 
 # Reset indices if segment changed
 if "previous_segment_index" not in st.session_state:
     st.session_state.previous_segment_index = st.session_state.segment_index
 
 if st.session_state.segment_index != st.session_state.previous_segment_index:
-    st.session_state.article_index = 0
-    st.session_state.entity_index = 0
+    st.session_state.entity_position = 0
     st.session_state.previous_segment_index = st.session_state.segment_index
     st.rerun()
 
-
-
 # Get articles for the selected segment
-selected_article_ids = segments[st.session_state.segment_index]
-filtered_df = lang_df[lang_df["article_id"].isin(selected_article_ids)].reset_index(drop=True)
-grouped = filtered_df.groupby("article_id")
-article_ids = list(grouped.groups.keys())
-
-# ——— The rest of your code (article_index, entity_index, etc.) remains unchanged but now uses `filtered_df` instead of full lang_df ———
-
-
+segment = plan.segments[st.session_state.segment_index]
+article_ids = segment.article_ids
+total_entities_in_segment = segment.n_entities
 
+# ——— Jump straight to any entity of the segment ———
+def jump_to_entity():
+    st.session_state.entity_position = st.session_state.jump_target - 1
+    st.session_state.just_submitted = False
+    st.session_state.last_response = None
 
+if not auto_assign:
+    with st.sidebar.form("jump_form", border=False):
+        st.number_input("🎯 Jump to entity", 1, max(total_entities_in_segment, 1), key="jump_target")
+        st.form_submit_button("Go", on_click=jump_to_entity)
 
+# ——— Article view: whole article or only a window around the entity ———
+if "expanded_row" not in st.session_state:
+    st.session_state.expanded_row = None
 
-current_article_id = article_ids[st.session_state.article_index]
-article_df = grouped.get_group(current_article_id).reset_index(drop=True)
-total_entities_in_segment = len(filtered_df)
-current_entity = sum(
-    len(grouped.get_group(aid))
-    for aid in article_ids[:st.session_state.article_index]
-) + st.session_state.entity_index + 1
+def expand_article(entity_row):
+    st.session_state.expanded_row = entity_row
 
-progress_ratio = current_entity / total_entities_in_segment if total_entities_in_segment > 0 else 0
-progress_ratio = min(progress_ratio, 1.0)
-st.progress(progress_ratio)
+st.sidebar.radio("🧾 Evaluation mode", ["One entity at a time", "Whole article"], key="eval_mode",
+                 disabled=auto_assign)
+st.sidebar.radio("📄 Article view", ["Full article", "Context window"], key="article_view")
+if st.session_state.article_view == "Context window":
+    st.sidebar.slider("↔️ Context window (characters)", 50, 2000, CONTEXT_WINDOW, 50, key="context_window")
 
-if progress_ratio >= 1.0:
+def show_completion(message):
     st.balloons()
     st.markdown("## 🎉 You're All Done!")
-    st.success(f"Thank you, **{session_name}**, for completing this segment in **{st.session_state.lang.upper()}**.")
+    st.success(message)
 
-    if st.session_state.responses:
+    if len(st.session_state.export_buffer):
         st.markdown("### 📥 Download Your Responses")
-        response_df = pd.DataFrame(st.session_state.responses)
-        csv = response_df.to_csv(index=False).encode('utf-8')
 
         st.download_button(
             label="📥 Download CSV File",
-            data=csv,
+            data=st.session_state.export_buffer.getvalue(),
             file_name=f"responses_{session_name}.csv",
             mime='text/csv'
         )
@@ -292,16 +331,75 @@ if progress_ratio >= 1.0:
     st.info("You can close the tab or change the segment/language from the sidebar to continue.")
     st.stop()
 
-
-
-if st.session_state.entity_index >= len(article_df):
-    st.session_state.article_index += 1
-    st.session_state.entity_index = 0
-    st.rerun()
+if auto_assign:
+    # ——— Take (or keep) a lease on one entity of the language ———
+    lang_keys = dataset.lang_keys[st.session_state.lang]
+    prioritizer = load_prioritizer(dataset, dataset.version)
+    coverage = lease_service.coverage(st.session_state.lang, lang_keys)
+    lease = st.session_state.lease
+    if lease is not None and dataset.key_rows.get(lease["entity_key"]) is None:
+        # The entity is gone from this dataset version (store rebuilt, span
+        # repaired); give the lease back and take a new one.
+        lease_service.release(lease["id"])
+        lease = st.session_state.lease = None
+    if lease is None or lease["lang"] != st.session_state.lang:
+        # Judgments from other processes and from segment mode arrive
+        # through the response store.
+        prioritizer.sync(coverage)
+        lease = lease_service.acquire(session_name, st.session_state.lang,
+                                      prioritizer.ranked_keys(st.session_state.lang))
+        st.session_state.lease = lease
+    elif not st.session_state.just_submitted:
+        lease_service.renew(lease["id"])
+
+    covered = sum(1 for k in lang_keys if coverage.get(k, 0) >= JUDGMENTS_PER_ENTITY)
+    st.progress(covered / len(lang_keys) if lang_keys else 1.0,
+                text=f"{covered}/{len(lang_keys)} entities fully judged in {st.session_state.lang.upper()}")
+
+    if lease is None:
+        show_completion(f"Thank you, **{session_name}**! There is nothing left for you to judge in **{st.session_state.lang.upper()}** right now.")
+
+    position = None
+    eval_row_ids = [dataset.key_rows[lease["entity_key"]]]
+else:
+    # entity_position counts the entities already behind the evaluator, so
+    # progress and the article/entity counters are plain lookups into the plan.
+    position = min(st.session_state.entity_position, total_entities_in_segment)
+    progress_ratio = position / total_entities_in_segment if total_entities_in_segment > 0 else 1.0
+    st.progress(progress_ratio, text=f"{position}/{total_entities_in_segment} entities")
+
+    if position >= total_entities_in_segment:
+        show_completion(f"Thank you, **{session_name}**, for completing this segment in **{st.session_state.lang.upper()}**.")
 
 # ─── Current Entity Row ─────────────────────────────────────────────
-row = article_df.iloc[st.session_state.entity_index]
-context = row["text"]
+# In whole-article mode the entities of the current article are judged in one
+# form: from the cursor to the end of the article, so entities already judged
+# (before a mode switch or a jump) are not served again. "Continue" then jumps
+# to the next article.
+# Auto-assigned entities are always judged one at a time.
+whole_article = not auto_assign and st.session_state.eval_mode == "Whole article"
+
+def eval_group(pos):
+    if whole_article:
+        a, _ = segment.locate(pos)
+        return range(pos, int(segment.article_starts[a + 1]))
+    return range(pos, pos + 1)
+
+def highlight_records(rows):
+    return [
+        {"start_offset": r["start_offset"], "end_offset": r["end_offset"], "predicted_fine_margin": r["predicted_fine_margin"]}
+        for r in rows
+    ]
+
+if not auto_assign:
+    article_index, entity_index = segment.locate(position)
+    article_size = segment.article_size(article_index)
+    eval_positions = eval_group(position)
+    next_position = eval_positions.stop
+    eval_row_ids = [int(segment.entity_rows[p]) for p in eval_positions]
+eval_rows = [df.iloc[i] for i in eval_row_ids]
+
+row = eval_rows[0]
 mention = row["entity_mention"]
 start = row["start_offset"]
 end = row["end_offset"]
@@ -310,8 +408,35 @@ predicted_roles = row["predicted_fine_margin"]
 article_id = row["article_id"]
 lang = row["lang"]
 
-record = {"start_offset": start, "end_offset": end, "predicted_fine_margin": predicted_roles}
-highlighted_html = highlight_entities(context, [record], "predicted_fine_margin")
+# Full article unless the evaluator chose the context view and has not
+# expanded this entity.
+view_window = st.session_state.context_window if st.session_state.article_view == "Context window" else None
+window = view_window if st.session_state.expanded_row != eval_row_ids[0] else None
+highlighted_html = render_article(
+    render_cache, dataset, row["article_idx"], highlight_records(eval_rows), "predicted_fine_margin",
+    window=window, context=dataset.entity_context(eval_row_ids[0]), context_start=row["context_start"],
+)
+
+# ─── Prefetch Upcoming Entities ────────────────────────────────────
+# Render the next PREFETCH_AHEAD entities (or articles, in whole-article
+# mode) and their role cards in the background, so "Continue" finds them
+# in the render cache.
+PREFETCH_AHEAD = 3
+
+upcoming = total_entities_in_segment if auto_assign else next_position
+for _ in range(PREFETCH_AHEAD):
+    if upcoming >= total_entities_in_segment:
+        break
+    group = eval_group(upcoming)
+    rows_ahead = [df.iloc[segment.entity_rows[p]] for p in group]
+    prefetcher.submit(*article_job(
+        dataset, rows_ahead[0]["article_idx"], highlight_records(rows_ahead), "predicted_fine_margin",
+        window=view_window, context=dataset.entity_context(segment.entity_rows[group.start]),
+        context_start=rows_ahead[0]["context_start"],
+    ))
+    for r in rows_ahead:
+        prefetcher.submit(*role_cards_job(taxonomy, r["predicted_role_ids"]))
+    upcoming = group.stop
 
 def parse_roles(predicted_roles):
     import ast
@@ -322,11 +447,11 @@ def parse_roles(predicted_roles):
             return [predicted_roles]
     elif isinstance(predicted_roles, dict):
         return list(predicted_roles.keys())
-    elif isinstance(predicted_roles, set):
+    elif isinstance(predicted_roles, (set, tuple)):
         return list(predicted_roles)
     return list(predicted_roles) if isinstance(predicted_roles, list) else []
 
-def render_label_wise_questions(predicted_roles):
+def render_label_wise_questions(predicted_roles, key_prefix=""):
     label_responses = {}
     parsed_roles = parse_roles(predicted_roles)
 
@@ -340,12 +465,12 @@ def render_label_wise_questions(predicted_roles):
             makes_sense = st.radio(
                 f"✅ Does the label '{label}' make sense for this entity?",
                 ["Yes", "No", "Unsure"],
-                key=f"makes_sense_{label}"
+                key=f"{key_prefix}makes_sense_{label}"
             )
             confidence = st.slider(
                 f"🔍 Your confidence for '{label}'",
                 1, 5, 3,
-                key=f"confidence_{label}"
+                key=f"{key_prefix}confidence_{label}"
             )
 
             label_responses[label] = {
@@ -357,11 +482,40 @@ def render_label_wise_questions(predicted_roles):
 
     return label_responses
 
+def build_responses(row, label_feedback, timestamp):
+    return [
+        {
+            "session_name": session_name,
+            "timestamp": timestamp,
+            "segement": segment_id,
+            "plan_id": plan_id,
+            "article_id": row["article_id"],
+            "entity_key": row["entity_key"],
+            "lang": row["lang"],
+            "entity_mention": row["entity_mention"],
+            "main_role": row["p_main_role"],
+            "predicted_role": label,
+            "label_index": feedback["label_index"],
+            "total_labels": feedback["total_labels"],
+            "makes_sense": feedback["makes_sense"],
+            "confidence": feedback["confidence"]
+        }
+        for label, feedback in label_feedback.items()
+    ]
+
 
 # ─── Layout ─────────────────────────────────────────────────────────
 left_col, right_col = st.columns([1.4, 1])
 with left_col:
-    st.markdown(f"**Language:** {lang} | **Article {st.session_state.article_index+1}/{len(article_ids)}** | **Entity {st.session_state.entity_index+1}/{len(article_df)}**")
+    if auto_assign:
+        st.markdown(f"**Language:** {lang} | **Article:** {html.escape(article_id)} | **Assigned entity**")
+    elif whole_article and len(eval_positions) < article_size:
+        remaining = len(eval_positions)
+        st.markdown(f"**Language:** {lang} | **Article {article_index+1}/{len(article_ids)}** | **{remaining} remaining {'entity' if remaining == 1 else 'entities'} of {article_size}**")
+    elif whole_article:
+        st.markdown(f"**Language:** {lang} | **Article {article_index+1}/{len(article_ids)}** | **{article_size} {'entity' if article_size == 1 else 'entities'}**")
+    else:
+        st.markdown(f"**Language:** {lang} | **Article {article_index+1}/{len(article_ids)}** | **Entity {entity_index+1}/{article_size}**")
     st.markdown("### 📄 Article Context")
     st.markdown("""
     <style>
@@ -379,6 +533,8 @@ with left_col:
     </style>
     """, unsafe_allow_html=True)
     st.markdown(f"<div class='article-box'>{highlighted_html}</div>", unsafe_allow_html=True)
+    if window is not None:
+        st.button("⤢ Show full article", on_click=expand_article, args=(eval_row_ids[0],))
 
 
 
@@ -392,33 +548,37 @@ with right_col:
         Select your answers thoughtfully, and submit when ready.
         """
     )
-    st.markdown(f"**Entity Mention**: <span style='color:#007BFF; font-weight:600;'>{html.escape(mention)}</span>", unsafe_allow_html=True)
-    st.markdown(f"**Main Role**: <span style='background:#cbd5e1;padding:4px 8px;border-radius:5px;margin:3px;display:inline-block;'>{html.escape(main_role)}</span>", unsafe_allow_html=True)
-    display_role_info(predicted_roles, "Predicted Fine-Grained Roles")
+    if not whole_article:
+        st.markdown(f"**Entity Mention**: <span style='color:#007BFF; font-weight:600;'>{html.escape(mention)}</span>", unsafe_allow_html=True)
+        st.markdown(f"**Main Role**: <span style='background:#cbd5e1;padding:4px 8px;border-radius:5px;margin:3px;display:inline-block;'>{html.escape(main_role)}</span>", unsafe_allow_html=True)
+        display_role_info(row["predicted_role_ids"], "Predicted Fine-Grained Roles")
     with st.form("eval_form"):
-        label_feedback = render_label_wise_questions(predicted_roles)
+        feedback_by_entity = []
+        for n, (i, r) in enumerate(zip(eval_row_ids, eval_rows)):
+            if whole_article:
+                st.markdown("---")
+                st.markdown(f"#### 🔸 Entity {n+1}/{len(eval_rows)}: <span style='color:#007BFF; font-weight:600;'>{html.escape(r['entity_mention'])}</span>", unsafe_allow_html=True)
+                st.markdown(f"**Main Role**: <span style='background:#cbd5e1;padding:4px 8px;border-radius:5px;margin:3px;display:inline-block;'>{html.escape(r['p_main_role'])}</span>", unsafe_allow_html=True)
+                display_role_info(r["predicted_role_ids"], "Predicted Fine-Grained Roles")
+                feedback_by_entity.append((r, render_label_wise_questions(r["predicted_fine_margin"], key_prefix=f"e{i}_")))
+            else:
+                feedback_by_entity.append((r, render_label_wise_questions(r["predicted_fine_margin"])))
         submit = st.form_submit_button("Submit")
 
         if submit:
             timestamp = datetime.now().isoformat()
-            for label, feedback in label_feedback.items():
-                response = {
-                    "session_name": session_name,
-                    "timestamp": timestamp,
-                    "segement": segment_id,
-                    "article_id": article_id,
-                    "lang": lang,
-                    "entity_mention": mention,
-                    "main_role": main_role,
-                    "predicted_role": label,
-                    "label_index": feedback["label_index"],
-                    "total_labels": feedback["total_labels"],
-                    "makes_sense": feedback["makes_sense"],
-                    "confidence": feedback["confidence"]
-                }
-                st.session_state.responses.append(response)
-
-            st.session_state.last_response = response  # Last one from loop
+            batch = []
+            for r, label_feedback in feedback_by_entity:
+                batch.extend(build_responses(r, label_feedback, timestamp))
+            st.session_state.export_buffer.append(batch)
+
+            # All label rows of the entity (or article) are committed together
+            response_writer.submit(batch)
+            if auto_assign:
+                lease_service.complete(st.session_state.lease["id"])
+                prioritizer.observe([r["entity_key"] for r in eval_rows])
+
+            st.session_state.last_response = batch[-1]
             st.session_state.just_submitted = True
             st.success("✅ Response submitted. Scroll down to continue.")
 
@@ -431,25 +591,18 @@ with right_col:
         st.markdown("---")
         st.markdown("### ✅ Done Evaluating?")
 
-        response_df = pd.DataFrame(st.session_state.responses)
-        csv = response_df.to_csv(index=False).encode("utf-8")
-
         st.download_button(
             label="📥 Download All Responses",
-            data=csv,
+            data=st.session_state.export_buffer.getvalue(),
             file_name=f"responses_{session_name}.csv",
             mime="text/csv"
         )
 
-        # Save last response locally
-        os.makedirs("responses", exist_ok=True)
-        local_path = f"responses/responses_{lang}.csv"
-        pd.DataFrame([st.session_state.last_response]).to_csv(
-            local_path, mode="a", header=not os.path.exists(local_path), index=False
-        )
-
         if st.button("➡️ Continue to Next"):
-            st.session_state.entity_index += 1
+            if auto_assign:
+                st.session_state.lease = None
+            else:
+                st.session_state.entity_position = next_position
             st.session_state.just_submitted = False
             st.session_state.last_response = None
             st.rerun()
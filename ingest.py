@@ -0,0 +1,351 @@
+import argparse
+import glob
+import hashlib
+import json
+import math
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from dataset import (ARTICLES_FILE, DICTIONARY_COLUMNS, ENTITIES_FILE, MANIFEST_FILE, MATRIX_FILES, STORE_DIR,
+                     _read_table, _write_json, entity_keys, load_dataset, read_manifest, sort_by_article,
+                     store_lock, write_store)
+from preprocess import check_span
+from render import CONTEXT_WINDOW
+from taxonomy import load_taxonomy
+
+# ─── Prediction Batch Ingestion ────────────────────────────────────
+# New model output arrives as JSONL files in predictions/, one entity per
+# line, and is merged into the dataset store without touching
+# combined_all.csv:
+#   {"article_id": "EN_CC_1.txt", "lang": "en", "text": "...",
+#    "entity_mention": "Greta Thunberg", "start_offset": 84, "end_offset": 98,
+#    "p_main_role": "Antagonist", "predicted_roles": {"Deceiver": 0.29, ...},
+#    "predicted_fine_margin": ["Deceiver", "Corrupt"],
+#    "fine_grained_roles": ["Terrorist"], "correct": false}
+# end_offset is exclusive; off-by-one spans are repaired as at build time
+# (see preprocess.py). `text` is only needed for articles not in the
+# store yet; fine_grained_roles (gold) and correct are optional.
+#
+# Files are read line by line from where the last run stopped, so a file
+# that is only appended to costs only its new lines. An entity whose span
+# is already in the store gets its predictions replaced; its gold labels
+# only when the record carries fine_grained_roles. Anything else is
+# appended. Records that fail validation are reported and skipped.
+
+PREDICTIONS_DIR = "predictions"
+
+REQUIRED_FIELDS = {
+    "article_id": str,
+    "lang": str,
+    "entity_mention": str,
+    "start_offset": int,
+    "end_offset": int,
+    "p_main_role": str,
+    "predicted_roles": dict,
+    "predicted_fine_margin": list,
+}
+OPTIONAL_FIELDS = {"text": str, "fine_grained_roles": list, "correct": bool}
+# Replaced when a batch re-predicts an entity already in the store; the
+# gold ones only if the record has fine_grained_roles.
+PREDICTION_COLUMNS = ["p_main_role"]
+PREDICTION_MATRICES = ["y_pred", "scores", "label_rank"]
+GOLD_COLUMNS = ["fine_grained_roles"]
+GOLD_MATRICES = ["y_true"]
+# Per-row flags of the batch, dropped before the rows are stored.
+BATCH_FLAGS = ["has_gold", "has_correct"]
+
+
+class RecordError(ValueError):
+    pass
+
+
+def _check_type(record, field, kind, required):
+    value = record.get(field)
+    if value is None:
+        if required:
+            raise RecordError(f"missing {field}")
+        return
+    # bool is an int subclass, so offsets must be checked explicitly.
+    if not isinstance(value, kind) or (kind is int and isinstance(value, bool)):
+        raise RecordError(f"{field}: expected {kind.__name__}, got {type(value).__name__}")
+
+
+def _role_set(roles):
+    return "{" + ", ".join(repr(r) for r in roles) + "}" if roles else "set()"
+
+
+# ─── Validation ────────────────────────────────────────────────────
+class BatchBuilder:
+    def __init__(self, taxonomy, articles):
+        self.fine_id = taxonomy.fine_id
+        self.coarse_roles = set(taxonomy.coarse_roles)
+        self.n_roles = len(taxonomy.fine_roles)
+        self._articles = articles
+        self._lookup = {aid: i for i, aid in enumerate(articles.column("article_id").to_pylist())}
+        self._texts, self._langs = {}, {}
+        self.new_articles, self.rows = [], []
+        self.repaired = {}
+        self.matrices = {name: [] for name in MATRIX_FILES}
+
+    def _article(self, article_id):
+        # (text, lang) of an article already in the store or in this batch.
+        if article_id not in self._texts and article_id in self._lookup:
+            i = self._lookup[article_id]
+            self._texts[article_id] = self._articles.column("text")[i].as_py()
+            self._langs[article_id] = self._articles.column("lang")[i].as_py()
+        return self._texts.get(article_id), self._langs.get(article_id)
+
+    def _roles(self, roles, field):
+        unknown = [r for r in roles if r not in self.fine_id]
+        if unknown:
+            raise RecordError(f"{field}: roles not in taxonomy: {unknown}")
+        if len(set(roles)) != len(roles):
+            raise RecordError(f"{field}: duplicate roles")
+        return [self.fine_id[r] for r in roles]
+
+    def add(self, record):
+        if not isinstance(record, dict):
+            raise RecordError("not a JSON object")
+        for field, kind in REQUIRED_FIELDS.items():
+            _check_type(record, field, kind, required=True)
+        for field, kind in OPTIONAL_FIELDS.items():
+            _check_type(record, field, kind, required=False)
+
+        article_id, lang = record["article_id"], record["lang"]
+        text, known_lang = self._article(article_id)
+        if text is None:
+            if record.get("text") is None:
+                raise RecordError(f"new article {article_id} without text")
+            text, known_lang = record["text"], lang
+        elif record.get("text") is not None and record["text"] != text:
+            raise RecordError(f"text differs from the stored text of {article_id}")
+        if lang != known_lang:
+            raise RecordError(f"lang {lang!r} differs from {known_lang!r} for {article_id}")
+
+        s, e, mention = record["start_offset"], record["end_offset"], record["entity_mention"]
+        status, s, e = check_span(text, s, e, mention)
+        if status == "unresolved":
+            raise RecordError(f"span {s}-{e} does not match {mention!r}")
+        self.repaired[status] = self.repaired.get(status, 0) + 1
+        if record["p_main_role"] not in self.coarse_roles:
+            raise RecordError(f"p_main_role {record['p_main_role']!r} not in taxonomy")
+
+        scores = record["predicted_roles"]
+        score_ids = self._roles(list(scores), "predicted_roles")
+        values = list(scores.values())
+        if not all(isinstance(v, (int, float)) and not isinstance(v, bool) and math.isfinite(v) for v in values):
+            raise RecordError("predicted_roles: scores must be finite numbers")
+        selected = record["predicted_fine_margin"]
+        selected_ids = self._roles(selected, "predicted_fine_margin")
+        if not selected_ids:
+            raise RecordError("predicted_fine_margin is empty")
+        if not set(selected) <= set(scores):
+            raise RecordError("predicted_fine_margin has roles without a score")
+        has_gold = record.get("fine_grained_roles") is not None
+        gold = record.get("fine_grained_roles") or []
+        gold_ids = self._roles(gold, "fine_grained_roles")
+
+        # Valid: record the article (if new) and the entity.
+        if article_id not in self._texts:
+            self._texts[article_id], self._langs[article_id] = text, lang
+            self.new_articles.append({"article_id": article_id, "lang": lang, "text": text})
+
+        y_true = np.zeros(self.n_roles, dtype=bool)
+        y_true[gold_ids] = True
+        y_pred = np.zeros(self.n_roles, dtype=bool)
+        y_pred[selected_ids] = True
+        row_scores = np.zeros(self.n_roles, dtype=np.float32)
+        row_scores[score_ids] = values
+        rank = np.zeros(self.n_roles, dtype=np.int8)
+        rank[selected_ids] = np.arange(1, len(selected_ids) + 1)
+
+        lo = max(0, s - CONTEXT_WINDOW)
+        context = text[lo:e + CONTEXT_WINDOW].strip()
+        correct = record.get("correct")
+        self.rows.append({
+            "article_id": article_id,
+            "entity_mention": mention,
+            "start_offset": s,
+            "end_offset": e,
+            "p_main_role": record["p_main_role"],
+            "fine_grained_roles": _role_set(gold),
+            "lang": lang,
+            "context": context,
+            "correct": bool((y_true == y_pred).all()) if correct is None else correct,
+            "context_start": text.find(context, lo),
+            "has_gold": has_gold,
+            "has_correct": correct is not None,
+        })
+        for name, row in (("y_true", y_true), ("y_pred", y_pred), ("scores", row_scores), ("label_rank", rank)):
+            self.matrices[name].append(row)
+
+
+# ─── Reading ───────────────────────────────────────────────────────
+def read_lines(path, offset=0, line_no=0):
+    # Complete lines from `offset` on, as (line number, bytes); a trailing
+    # line without "\n" may still be being written and is left for later.
+    with open(path, "rb") as f:
+        f.seek(offset)
+        for line in f:
+            if not line.endswith(b"\n"):
+                break
+            line_no += 1
+            yield line_no, line
+
+
+def prefix_hash(path, length):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        while length > 0:
+            chunk = f.read(min(1 << 20, length))
+            if not chunk:
+                break
+            h.update(chunk)
+            length -= len(chunk)
+    return h.hexdigest()
+
+
+def pending_files(manifest, predictions_dir=PREDICTIONS_DIR):
+    # (path, byte offset, lines before it) for every file with unread
+    # lines. A file whose already-read part changed is read again in full.
+    sources = manifest.get("sources", {})
+    for path in sorted(glob.glob(os.path.join(predictions_dir, "*.jsonl"))):
+        name, size = os.path.basename(path), os.path.getsize(path)
+        source = sources.get(name)
+        offset, lines = 0, 0
+        if source and source["offset"] <= size and prefix_hash(path, source["offset"]) == source["prefix_sha256"]:
+            offset, lines = source["offset"], source["lines"]
+        if size > offset:
+            yield path, offset, lines
+
+
+# ─── Store Update ──────────────────────────────────────────────────
+def _merge(store_dir, batch, manifest):
+    articles = _read_table(os.path.join(store_dir, ARTICLES_FILE)).to_pandas()
+    # Categoricals back to strings, so replaced predictions may bring new values.
+    entities = _read_table(os.path.join(store_dir, ENTITIES_FILE)).to_pandas()
+    entities = entities.astype({col: object for col in DICTIONARY_COLUMNS})
+    matrices = {name: np.load(os.path.join(store_dir, f)) for name, f in MATRIX_FILES.items()}
+
+    new = pd.DataFrame(batch.rows)
+    new_matrices = {name: np.stack(rows) for name, rows in batch.matrices.items()}
+    new_keys = entity_keys(new)
+    # Within a batch the last prediction for a span wins.
+    last = ~new_keys.duplicated(keep="last").to_numpy()
+    new, new_keys = new[last].reset_index(drop=True), new_keys[last].reset_index(drop=True)
+    new_matrices = {name: m[last] for name, m in new_matrices.items()}
+
+    # Spans already in the store: replace their predictions in place. A
+    # record without gold keeps the stored gold; `correct` is then worked
+    # out against it unless the record gives one.
+    source = pd.Index(new_keys).get_indexer(entity_keys(entities))
+    hit = source >= 0
+    gold = hit.copy()
+    gold[hit] = new["has_gold"].to_numpy()[source[hit]]
+    for col in PREDICTION_COLUMNS:
+        entities.loc[hit, col] = new[col].to_numpy()[source[hit]]
+    for name in PREDICTION_MATRICES:
+        matrices[name][hit] = new_matrices[name][source[hit]]
+    for col in GOLD_COLUMNS:
+        entities.loc[gold, col] = new[col].to_numpy()[source[gold]]
+    for name in GOLD_MATRICES:
+        matrices[name][gold] = new_matrices[name][source[gold]]
+    given = hit.copy()
+    given[hit] = new["has_correct"].to_numpy()[source[hit]]
+    entities.loc[given, "correct"] = new["correct"].to_numpy()[source[given]]
+    derived = hit & ~given
+    entities.loc[derived, "correct"] = (matrices["y_true"][derived] == matrices["y_pred"][derived]).all(axis=1)
+
+    fresh = np.ones(len(new), dtype=bool)
+    fresh[source[hit]] = False
+    new = new[fresh].drop(columns=BATCH_FLAGS)
+    entities = pd.concat([entities, new.astype({"start_offset": np.int32, "end_offset": np.int32,
+                                                "context_start": np.int32})], ignore_index=True)
+    articles = pd.concat([articles, pd.DataFrame(batch.new_articles, columns=articles.columns)], ignore_index=True)
+    articles, entities, order = sort_by_article(articles, entities)
+    matrices = {name: np.concatenate([m, new_matrices[name][fresh]])[order] for name, m in matrices.items()}
+
+    languages = manifest["languages"] + [l for l in dict.fromkeys(new["lang"]) if l not in manifest["languages"]]
+    manifest = manifest | {"languages": languages}
+    return articles, entities, matrices, manifest, int(hit.sum()), int(fresh.sum())
+
+
+def ingest_file(path, offset=0, lines=0, store_dir=STORE_DIR, taxonomy=None):
+    taxonomy = taxonomy or load_taxonomy()
+    with store_lock(store_dir, exclusive=True):
+        manifest = read_manifest(store_dir)
+        batch = BatchBuilder(taxonomy, _read_table(os.path.join(store_dir, ARTICLES_FILE)))
+        digest = hashlib.sha256()
+        end, errors, records = offset, [], 0
+        for line_no, line in read_lines(path, offset, lines):
+            lines = line_no
+            end += len(line)
+            digest.update(line)
+            if not line.strip():
+                continue
+            records += 1
+            try:
+                batch.add(json.loads(line))
+            except (json.JSONDecodeError, UnicodeDecodeError, RecordError) as exc:
+                errors.append((line_no, str(exc)))
+
+        report = {"file": os.path.basename(path), "records": records, "updated": 0, "appended": 0,
+                  "rejected": len(errors), "errors": errors, "version": manifest["version"],
+                  "repaired": {k: n for k, n in batch.repaired.items() if k != "ok"}}
+        if batch.rows:
+            articles, entities, matrices, manifest, updated, appended = _merge(store_dir, batch, manifest)
+            batch_sha256 = digest.hexdigest()
+            version = hashlib.sha256(f"{manifest['version']}:{batch_sha256}".encode()).hexdigest()[:12]
+            manifest["batches"] = manifest.get("batches", []) + [{
+                "file": report["file"], "from": offset, "to": end, "sha256": batch_sha256,
+                "records": records, "updated": updated, "appended": appended, "rejected": len(errors),
+            }]
+            manifest["version"] = version
+            report.update(updated=updated, appended=appended, version=version)
+        else:
+            articles = entities = matrices = None
+
+        manifest.setdefault("sources", {})[report["file"]] = {
+            "offset": end, "lines": lines, "prefix_sha256": prefix_hash(path, end),
+        }
+        if articles is not None:
+            write_store(store_dir, articles, entities, matrices, manifest)
+        else:
+            # Nothing valid: only remember how far the file was read.
+            _write_json(manifest, os.path.join(store_dir, MANIFEST_FILE))
+    return report
+
+
+def ingest_pending(predictions_dir=PREDICTIONS_DIR, store_dir=STORE_DIR):
+    if not os.path.isdir(predictions_dir):
+        return []
+    taxonomy = None
+    reports = []
+    for path, offset, lines in list(pending_files(read_manifest(store_dir) or {}, predictions_dir)):
+        taxonomy = taxonomy or load_taxonomy()
+        reports.append(ingest_file(path, offset, lines, store_dir, taxonomy))
+    return reports
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ingest prediction batches (JSONL) into the dataset store.")
+    parser.add_argument("--dir", default=PREDICTIONS_DIR)
+    parser.add_argument("--store", default=STORE_DIR)
+    parser.add_argument("--watch", type=float, metavar="SECONDS", help="keep polling for new lines")
+    parser.add_argument("--max-errors", type=int, default=20, help="rejected records to print per file")
+    args = parser.parse_args()
+
+    load_dataset(store_dir=args.store, ingest=False)
+    while True:
+        for report in ingest_pending(args.dir, args.store):
+            print(f"✅ {report['file']}: {report['appended']} appended, {report['updated']} updated, "
+                  f"{sum(report['repaired'].values())} spans repaired, {report['rejected']} rejected "
+                  f"(version {report['version']})")
+            for line_no, message in report["errors"][:args.max_errors]:
+                print(f"   line {line_no}: {message}")
+        if not args.watch:
+            break
+        time.sleep(args.watch)
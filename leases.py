@@ -0,0 +1,177 @@
+import os
+import sqlite3
+import threading
+import time
+
+from store import RESPONSE_DB, create_schema
+
+# ─── Lease-Based Work Distribution ─────────────────────────────────
+# Hands out one entity at a time to each evaluator from a shared queue kept
+# in the response database. A lease is "active" until it is completed,
+# released, or runs past its expiry, at which point the entity goes back
+# into the pool. Entities are served until `target` evaluators have judged
+# them, least-covered first, and never twice to the same evaluator.
+#
+# Judgments are counted from the responses table, whatever mode they were
+# made in: by entity_key, or by article and mention for rows stored before
+# entity_key was recorded. A completed lease stands in for its judgment for
+# PENDING_SECONDS, until the background writer has stored the rows; if the
+# write fails, the entity is simply served again.
+
+PENDING_SECONDS = 60
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS leases (
+    id           INTEGER PRIMARY KEY,
+    lang         TEXT NOT NULL,
+    entity_key   TEXT NOT NULL,
+    session_name TEXT NOT NULL,
+    status       TEXT NOT NULL,
+    leased_at    REAL NOT NULL,
+    expires_at   REAL NOT NULL,
+    completed_at REAL
+);
+CREATE INDEX IF NOT EXISTS leases_entity ON leases (lang, entity_key, status);
+CREATE INDEX IF NOT EXISTS leases_session ON leases (session_name, status);
+"""
+
+
+class LeaseService:
+    def __init__(self, path=RESPONSE_DB, lease_seconds=900, target=3, timeout=30.0):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.target = target
+        self.timeout = timeout
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        conn = self._connect()
+        create_schema(conn)
+        conn.executescript(SCHEMA)
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.row_factory = sqlite3.Row
+            self._local.conn = conn
+        return conn
+
+    def _transaction(self, fn, *args):
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            result = fn(conn, *args)
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+        return result
+
+    def _reclaim(self, conn, now):
+        conn.execute(
+            "UPDATE leases SET status = 'expired' WHERE status = 'active' AND expires_at < ?", (now,)
+        )
+
+    # ——— Acquire ———
+    # `candidates` are a language's entity keys (Dataset.entities["entity_key"])
+    # in serving order; ties in coverage are broken by that order.
+    def acquire(self, session_name, lang, candidates):
+        return self._transaction(self._acquire, session_name, lang, candidates)
+
+    def _acquire(self, conn, session_name, lang, candidates):
+        now = time.time()
+        self._reclaim(conn, now)
+
+        candidates = list(candidates)
+        valid = set(candidates)
+        # A held lease is kept only while its key is still a candidate; keys
+        # disappear when the store is rebuilt or a span is repaired.
+        for held in conn.execute(
+            "SELECT * FROM leases WHERE session_name = ? AND lang = ? AND status = 'active' ORDER BY id",
+            (session_name, lang),
+        ).fetchall():
+            if held["entity_key"] in valid:
+                conn.execute("UPDATE leases SET expires_at = ? WHERE id = ?", (now + self.lease_seconds, held["id"]))
+                return dict(held)
+            conn.execute("UPDATE leases SET status = 'released' WHERE id = ?", (held["id"],))
+
+        judged = self._judged(conn, lang, candidates, now)
+        load = {key: len(sessions) for key, sessions in judged.items()}
+        seen = {key for key, sessions in judged.items() if session_name in sessions}
+        for r in conn.execute(
+            "SELECT entity_key, session_name FROM leases WHERE lang = ? AND status = 'active'", (lang,)
+        ):
+            load[r["entity_key"]] = load.get(r["entity_key"], 0) + 1
+            if r["session_name"] == session_name:
+                seen.add(r["entity_key"])
+
+        best = None
+        for order, key in enumerate(candidates):
+            n = load.get(key, 0)
+            if n >= self.target or key in seen:
+                continue
+            if best is None or n < best[0]:
+                best = (n, order, key)
+                if n == 0:
+                    break
+        if best is None:
+            return None
+
+        cur = conn.execute(
+            "INSERT INTO leases (lang, entity_key, session_name, status, leased_at, expires_at) "
+            "VALUES (?, ?, ?, 'active', ?, ?)",
+            (lang, best[2], session_name, now, now + self.lease_seconds),
+        )
+        return dict(conn.execute("SELECT * FROM leases WHERE id = ?", (cur.lastrowid,)).fetchone())
+
+    # ——— Lease Updates ———
+    def renew(self, lease_id):
+        self._connect().execute(
+            "UPDATE leases SET expires_at = ? WHERE id = ? AND status = 'active'",
+            (time.time() + self.lease_seconds, lease_id),
+        )
+
+    def complete(self, lease_id):
+        # The judgment itself is counted from the responses table.
+        self._connect().execute(
+            "UPDATE leases SET status = 'done', completed_at = ? WHERE id = ? AND status IN ('active', 'expired')",
+            (time.time(), lease_id),
+        )
+
+    def release(self, lease_id):
+        self._connect().execute(
+            "UPDATE leases SET status = 'released' WHERE id = ? AND status = 'active'", (lease_id,)
+        )
+
+    # ——— Coverage ———
+    def _judged(self, conn, lang, keys, now):
+        # entity_key → sessions that judged it. Rows without an entity_key
+        # count for every one of `keys` with their article and mention.
+        keys = list(keys)
+        by_mention = {}
+        for key in keys:
+            article_id, _, mention = key.split("#", 2)
+            by_mention.setdefault((article_id, mention), []).append(key)
+        judged = {}
+        for r in conn.execute(
+            "SELECT DISTINCT entity_key, article_id, entity_mention, session_name FROM responses WHERE lang = ?",
+            (lang,),
+        ):
+            if r["entity_key"] is not None:
+                matches = [r["entity_key"]]
+            else:
+                matches = by_mention.get((r["article_id"], r["entity_mention"]), [])
+            for key in matches:
+                judged.setdefault(key, set()).add(r["session_name"])
+        for r in conn.execute(
+            "SELECT entity_key, session_name FROM leases WHERE lang = ? AND status = 'done' AND completed_at >= ?",
+            (lang, now - PENDING_SECONDS),
+        ):
+            judged.setdefault(r["entity_key"], set()).add(r["session_name"])
+        return judged
+
+    def coverage(self, lang, keys):
+        # {entity_key: evaluators who judged it} over `keys`, e.g. Dataset.lang_keys[lang].
+        judged = self._judged(self._connect(), lang, keys, time.time())
+        return {key: len(sessions) for key, sessions in judged.items()}
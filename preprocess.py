@@ -0,0 +1,174 @@
+import argparse
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+# ─── Span Validation ───────────────────────────────────────────────
+# Every entity span is checked against its article at build time, so the
+# app can slice text[start_offset:end_offset] without checks. end_offset
+# is exclusive. A span that does not match its mention is repaired when one
+# of these explains it, tried in order:
+#   end_inclusive  – end points at the last character (e + 1)
+#   end_overshoot  – end one past the exclusive end (e - 1)
+#   shift_left / shift_right – both offsets off by one
+#   length         – start is right, end is not (s + len(mention))
+#   relocated      – the nearest occurrence within RELOCATE_WINDOW chars
+# Spans that still do not match are "unresolved" and kept as they are.
+# Identical spans in one article are duplicates; spans that intersect
+# another span in the same article are overlaps. Both are only reported.
+
+RELOCATE_WINDOW = 200
+# Below this many entities a process pool costs more than it saves.
+PARALLEL_MIN_ROWS = 20000
+
+SHIFTS = [
+    ("end_inclusive", 0, 1),
+    ("end_overshoot", 0, -1),
+    ("shift_left", -1, -1),
+    ("shift_right", 1, 1),
+]
+
+
+def check_span(text, start, end, mention):
+    # → (status, start, end); status is "ok", a repair, or "unresolved".
+    if 0 <= start < end <= len(text) and text[start:end] == mention:
+        return "ok", start, end
+    for status, ds, de in SHIFTS:
+        s, e = start + ds, end + de
+        if 0 <= s < e <= len(text) and text[s:e] == mention:
+            return status, s, e
+    if mention and text[start:start + len(mention)] == mention:
+        return "length", start, start + len(mention)
+    if mention:
+        lo = max(0, start - RELOCATE_WINDOW)
+        hits, i = [], text.find(mention, lo)
+        while 0 <= i <= start + RELOCATE_WINDOW:
+            hits.append(i)
+            i = text.find(mention, i + 1)
+        if hits:
+            s = min(hits, key=lambda h: abs(h - start))
+            return "relocated", s, s + len(mention)
+    return "unresolved", start, end
+
+
+def span_flags(article_ids, starts, ends):
+    # (duplicate, overlap) per span, among spans of the same article.
+    frame = pd.DataFrame({"article": article_ids, "start": starts, "end": ends})
+    duplicate = frame.duplicated(["article", "start", "end"], keep=False).to_numpy()
+
+    spans = frame.drop_duplicates(["article", "start", "end"]).sort_values(["article", "start", "end"])
+    by_article = spans.groupby("article", sort=False)
+    # A span overlaps if an earlier span ends after it starts, or a later
+    # one starts before it ends.
+    prev_end = by_article["end"].cummax().groupby(spans["article"]).shift(1)
+    next_start = by_article["start"].shift(-1)
+    overlapping = (spans["start"] < prev_end) | (spans["end"] > next_start)
+    keys = pd.MultiIndex.from_frame(spans.loc[overlapping, ["article", "start", "end"]])
+    overlap = pd.MultiIndex.from_frame(frame[["article", "start", "end"]]).isin(keys)
+    return duplicate, overlap
+
+
+# ─── Shards ────────────────────────────────────────────────────────
+# One shard per language: its entity spans plus the texts of its articles.
+def validate_shard(shard):
+    lang, article_ids, starts, ends, mentions, texts = shard
+    checked = [check_span(texts[a], int(s), int(e), m) for a, s, e, m in zip(article_ids, starts, ends, mentions)]
+    status = np.array([c[0] for c in checked], dtype=object)
+    new_starts = np.array([c[1] for c in checked], dtype=np.int64)
+    new_ends = np.array([c[2] for c in checked], dtype=np.int64)
+    duplicate, overlap = span_flags(article_ids, new_starts, new_ends)
+    return lang, status, new_starts, new_ends, duplicate, overlap
+
+
+def validate_spans(entities, texts, workers=None):
+    # entities: article_id, lang, entity_mention, start_offset, end_offset;
+    # texts: article_id → text. Returns a frame of span_status, repaired
+    # offsets and flags aligned with `entities`, and a per-language report.
+    langs = entities["lang"].to_numpy()
+    shards, rows = [], {}
+    for lang in dict.fromkeys(langs):
+        idx = np.flatnonzero(langs == lang)
+        part = entities.iloc[idx]
+        article_ids = part["article_id"].to_numpy()
+        shards.append((lang, article_ids, part["start_offset"].to_numpy(), part["end_offset"].to_numpy(),
+                       part["entity_mention"].to_numpy(), {a: texts[a] for a in dict.fromkeys(article_ids)}))
+        rows[lang] = idx
+
+    if workers is None:
+        workers = os.cpu_count() if len(entities) >= PARALLEL_MIN_ROWS else 1
+    if workers > 1 and len(shards) > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(shards))) as pool:
+            results = list(pool.map(validate_shard, shards))
+    else:
+        results = [validate_shard(shard) for shard in shards]
+
+    out = pd.DataFrame({
+        "span_status": np.empty(len(entities), dtype=object),
+        "start_offset": np.zeros(len(entities), dtype=np.int64),
+        "end_offset": np.zeros(len(entities), dtype=np.int64),
+        "duplicate_span": np.zeros(len(entities), dtype=bool),
+        "overlapping_span": np.zeros(len(entities), dtype=bool),
+    }, index=entities.index)
+    report = {}
+    for lang, status, starts, ends, duplicate, overlap in results:
+        idx = rows[lang]
+        for col, values in zip(out.columns, (status, starts, ends, duplicate, overlap)):
+            out.iloc[idx, out.columns.get_loc(col)] = values
+        counts = pd.Series(status).value_counts()
+        report[lang] = {
+            "entities": len(idx),
+            "ok": int(counts.get("ok", 0)),
+            "repaired": {k: int(v) for k, v in counts.items() if k not in ("ok", "unresolved")},
+            "unresolved": int(counts.get("unresolved", 0)),
+            "duplicates": int(duplicate.sum()),
+            "overlaps": int(overlap.sum()),
+        }
+    return out, report
+
+
+def span_issues(entities, spans):
+    # Rows worth a look: anything not "ok", duplicated or overlapping.
+    flagged = (spans["span_status"] != "ok") | spans["duplicate_span"] | spans["overlapping_span"]
+    issues = entities.loc[flagged, ["article_id", "lang", "entity_mention", "start_offset", "end_offset"]]
+    return issues.join(spans.loc[flagged].add_prefix("new_").rename(columns={
+        "new_span_status": "span_status", "new_duplicate_span": "duplicate_span",
+        "new_overlapping_span": "overlapping_span",
+    }))
+
+
+def write_report(report, issues, path):
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"languages": report, "issues": issues.to_dict("records")}, f, indent=2, ensure_ascii=False)
+    os.replace(tmp, path)
+
+
+if __name__ == "__main__":
+    from dataset import SOURCE_CSV, _write_table
+
+    parser = argparse.ArgumentParser(description="Validate and repair entity spans, one process per language.")
+    parser.add_argument("csv", nargs="?", default=SOURCE_CSV)
+    parser.add_argument("--out", default="data/shards")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    df = pd.read_csv(args.csv, encoding="utf-8")
+    texts = dict(zip(df["article_id"], df["text"]))
+    spans, report = validate_spans(df, texts, args.workers)
+    issues = span_issues(df, spans)
+
+    # Per-language shards of the validated entities, offsets repaired.
+    os.makedirs(args.out, exist_ok=True)
+    validated = df.drop(columns=["text"]).assign(**{c: spans[c] for c in spans.columns})
+    for lang, shard in validated.groupby("lang", sort=False):
+        _write_table(shard.reset_index(drop=True), os.path.join(args.out, f"{lang}.arrow"))
+    write_report(report, issues, os.path.join(args.out, "span_report.json"))
+
+    for lang, r in report.items():
+        repaired = sum(r["repaired"].values())
+        print(f"{'✅' if not r['unresolved'] else '⚠️'} {lang}: {r['entities']} spans, {r['ok']} ok, "
+              f"{repaired} repaired, {r['unresolved']} unresolved, {r['duplicates']} duplicates, {r['overlaps']} overlaps")
+    print(f"→ {args.out}/")
@@ -0,0 +1,92 @@
+import argparse
+import threading
+
+import numpy as np
+
+from dataset import load_dataset
+
+# ─── Uncertainty Signals ───────────────────────────────────────────
+# Computed once over the whole dataset from the decoded label matrices:
+#   margin        – 1 - (top-1 minus top-2 normalized score); high when the
+#                   model is torn between two roles
+#   entropy       – entropy of the normalized scores / log(n_roles)
+#   disagreement  – Jaccard distance between y_pred and y_true
+PRIORITY_WEIGHTS = {"margin": 0.4, "entropy": 0.3, "disagreement": 0.3}
+
+
+def uncertainty_signals(scores, y_pred, y_true):
+    scores = np.asarray(scores, dtype=np.float64)
+    totals = scores.sum(axis=1, keepdims=True)
+    p = np.divide(scores, totals, out=np.zeros_like(scores), where=totals > 0)
+
+    top2 = -np.partition(-p, 1, axis=1)[:, :2]
+    margin = 1.0 - (top2[:, 0] - top2[:, 1])
+
+    logp = np.log(p, out=np.zeros_like(p), where=p > 0)
+    entropy = -(p * logp).sum(axis=1) / np.log(p.shape[1])
+
+    y_pred, y_true = np.asarray(y_pred, bool), np.asarray(y_true, bool)
+    union = (y_pred | y_true).sum(axis=1)
+    inter = (y_pred & y_true).sum(axis=1)
+    disagreement = 1.0 - np.divide(inter, union, out=np.ones(len(union)), where=union > 0)
+
+    return {"margin": margin, "entropy": entropy, "disagreement": disagreement}
+
+
+def priority_scores(signals, weights=PRIORITY_WEIGHTS):
+    return sum(weights[name] * signals[name] for name in weights)
+
+
+# ─── Prioritizer ───────────────────────────────────────────────────
+# Ranks a language's entities by uncertainty, discounted by how many
+# judgments each already has: effective = base / (1 + judgments). New
+# judgments are folded in with observe(), which only touches the rows it
+# is given; ranking a language is one argsort over its rows.
+class Prioritizer:
+    def __init__(self, dataset, weights=PRIORITY_WEIGHTS):
+        self.dataset = dataset
+        self.signals = uncertainty_signals(dataset.scores, dataset.y_pred, dataset.y_true)
+        self.base = priority_scores(self.signals, weights)
+        self.judgments = np.zeros(len(self.base), dtype=np.int32)
+        self._lock = threading.Lock()
+
+    def observe(self, entity_keys):
+        rows = [self.dataset.key_rows[k] for k in entity_keys if k in self.dataset.key_rows]
+        with self._lock:
+            np.add.at(self.judgments, rows, 1)
+
+    def sync(self, judged_counts):
+        # judged_counts: {entity_key: completed judgments}, e.g. from
+        # LeaseService.coverage(); only keys present are touched.
+        rows = [self.dataset.key_rows[k] for k in judged_counts if k in self.dataset.key_rows]
+        counts = [judged_counts[k] for k in judged_counts if k in self.dataset.key_rows]
+        with self._lock:
+            self.judgments[rows] = np.maximum(self.judgments[rows], counts)
+
+    def effective(self, rows):
+        return self.base[rows] / (1.0 + self.judgments[rows])
+
+    def ranked_rows(self, lang):
+        rows = self.dataset.lang_rows[lang]
+        order = np.argsort(-self.effective(rows), kind="stable")
+        return rows[order]
+
+    def ranked_keys(self, lang):
+        keys = self.dataset.entities["entity_key"].to_numpy()
+        return list(dict.fromkeys(keys[self.ranked_rows(lang)]))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Show the most uncertain entities per language.")
+    parser.add_argument("--lang", action="append", help="language code (repeatable); default: all")
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+
+    dataset = load_dataset()
+    prioritizer = Prioritizer(dataset)
+    entities = dataset.entities
+    for lang in args.lang or dataset.languages:
+        print(f"\n{lang}")
+        for row in prioritizer.ranked_rows(lang)[:args.top]:
+            signals = ", ".join(f"{name} {prioritizer.signals[name][row]:.2f}" for name in PRIORITY_WEIGHTS)
+            print(f"  {prioritizer.base[row]:.3f}  {entities['article_id'][row]}  {entities['entity_mention'][row]}  ({signals})")
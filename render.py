@@ -0,0 +1,189 @@
+import html
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+# Characters kept on each side of an entity in the `context` column.
+CONTEXT_WINDOW = 150
+GAP = "<span class='context-gap'> … </span>"
+
+
+# ─── Highlight Function ─────────────────────────────────────────────
+# `offset` is where `text` starts inside the article, for when only a
+# slice of it is rendered; record offsets are always article offsets and
+# end_offset is exclusive (spans are validated when the store is built).
+def highlight_entities(text, records, label_column,
+                       default_color="#facc15", compare_column=None, offset=0):
+    out, last = [], 0
+    records = sorted(records, key=lambda r: r["start_offset"])
+    for ent in records:
+        s, e = ent["start_offset"] - offset, ent["end_offset"] - offset
+        mention = html.escape(text[s:e])
+        labels = ent[label_column]
+        label_str = ", ".join(labels)
+        bg = default_color
+        if compare_column:
+            is_match = set(labels) == set(ent[compare_column])
+            bg = "#96f1b3" if is_match else "#d87575"
+            other = ", ".join(ent[compare_column])
+            label_str = f"pred: {label_str} ⇄ gold: {other}"
+        out.append(html.escape(text[last:s]))
+        out.append(
+            f"<span class='entity' style='background:{bg}'>{mention}</span>"
+            f"<span class='entity-label'>{html.escape(label_str)}</span>"
+        )
+        last = e
+    out.append(html.escape(text[last:]))
+    return "".join(out)
+
+
+# ─── Windowed Highlighting ─────────────────────────────────────────
+# Only the text within `window` characters of an entity is escaped and
+# rendered; overlapping windows are merged and the gaps shown as "…".
+def _windows(records, window, length):
+    merged = []
+    for ent in sorted(records, key=lambda r: r["start_offset"]):
+        lo = max(0, ent["start_offset"] - window)
+        hi = min(length, ent["end_offset"] + window)
+        if merged and lo <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], hi)
+            merged[-1][2].append(ent)
+        else:
+            merged.append([lo, hi, [ent]])
+    return merged
+
+
+def _strip_window(text, lo, hi, group):
+    # Drop whitespace at the window edges, never cutting into an entity.
+    first = min(ent["start_offset"] for ent in group)
+    final = max(ent["end_offset"] for ent in group)
+    chunk = text[lo:hi]
+    lo = min(first, lo + len(chunk) - len(chunk.lstrip()))
+    hi = max(final, hi - (len(chunk) - len(chunk.rstrip())))
+    return lo, hi
+
+
+def highlight_window(text, records, label_column, window=CONTEXT_WINDOW, **kwargs):
+    out, last = [], 0
+    for lo, hi, group in _windows(records, window, len(text)):
+        lo, hi = _strip_window(text, lo, hi, group)
+        if lo > last:
+            out.append(GAP)
+        out.append(highlight_entities(text[lo:hi], group, label_column, offset=lo, **kwargs))
+        last = hi
+    if last < len(text):
+        out.append(GAP)
+    return "".join(out)
+
+
+def highlight_context(context, context_start, record, article_length, label_column, **kwargs):
+    # The `context` column is text[start - CONTEXT_WINDOW : end + CONTEXT_WINDOW],
+    # clipped to the article and stripped, beginning at `context_start`. A
+    # single entity at the default window therefore needs no article text.
+    lo = context_start
+    body = highlight_entities(context, [record], label_column, offset=lo, **kwargs)
+    head = GAP if lo > 0 else ""
+    tail = GAP if lo + len(context) < article_length else ""
+    return head + body + tail
+
+
+# ─── Render Cache ──────────────────────────────────────────────────
+# Process-wide LRU of rendered article HTML. Rendering happens outside the
+# lock; two sessions racing on the same key just render it twice.
+class RenderCache:
+    def __init__(self, maxsize=512):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, build):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key]
+        value = build()
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return value
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+
+def span_key(records, label_column, compare_column=None):
+    return tuple(sorted(
+        (
+            int(r["start_offset"]),
+            int(r["end_offset"]),
+            tuple(r[label_column]),
+            tuple(r[compare_column]) if compare_column else None,
+        )
+        for r in records
+    ))
+
+
+# window=None renders the whole article. Returns the cache key and a
+# function that renders the HTML for it.
+def article_job(dataset, article_idx, records, label_column,
+                compare_column=None, window=None, context=None, context_start=-1):
+    key = (dataset.version, int(article_idx), span_key(records, label_column, compare_column),
+           label_column, compare_column, window)
+
+    def build():
+        if window == CONTEXT_WINDOW and context is not None and context_start >= 0 and len(records) == 1:
+            return highlight_context(context, context_start, records[0], int(dataset.article_lengths[article_idx]),
+                                     label_column, compare_column=compare_column)
+        text = dataset.article_text(article_idx)
+        if window is None:
+            return highlight_entities(text, records, label_column, compare_column=compare_column)
+        return highlight_window(text, records, label_column, window, compare_column=compare_column)
+
+    return key, build
+
+
+def render_article(cache, dataset, article_idx, records, label_column, **kwargs):
+    return cache.get(*article_job(dataset, article_idx, records, label_column, **kwargs))
+
+
+def role_cards_job(taxonomy, role_ids):
+    role_ids = tuple(int(i) for i in role_ids)
+    return ("cards", role_ids), lambda: "".join(taxonomy.card(i) for i in role_ids)
+
+
+def render_role_cards(cache, taxonomy, role_ids):
+    return cache.get(*role_cards_job(taxonomy, role_ids))
+
+
+# ─── Prefetcher ────────────────────────────────────────────────────
+# Renders upcoming entities into the RenderCache on a small thread pool
+# while the evaluator is still reading the current one. Jobs whose key is
+# already cached or queued are skipped.
+class Prefetcher:
+    def __init__(self, cache, max_workers=2):
+        self.cache = cache
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="prefetch")
+        self._pending = set()
+        self._lock = threading.Lock()
+
+    def submit(self, key, build):
+        if key in self.cache:
+            return
+        with self._lock:
+            if key in self._pending:
+                return
+            self._pending.add(key)
+        self._pool.submit(self._run, key, build)
+
+    def _run(self, key, build):
+        try:
+            self.cache.get(key, build)
+        finally:
+            with self._lock:
+                self._pending.discard(key)
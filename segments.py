@@ -0,0 +1,216 @@
+import argparse
+import hashlib
+import heapq
+import json
+import os
+
+import numpy as np
+
+from arrays import readonly
+from dataset import STORE_DIR, load_dataset
+
+PLANS_DIR = os.path.join(STORE_DIR, "plans")
+
+# ─── Segments per Language ─────────────────────────────────────────
+LANGUAGE_SEGMENTS = {
+    "bg": 1,   # 10 articles, 14 entities
+    "pt": 1,   # low annotator coverage
+    "hi": 5,   # 142 entities → ~28 per segment
+    "ru": 3,   # 45 entities → ~15 per segment
+    "en": 4,   # 58 entities → ~14-15 per segment
+}
+
+
+# ─── Segment ───────────────────────────────────────────────────────
+# A run of whole articles. `entity_rows` are row numbers into
+# Dataset.entities, grouped by article; `article_starts[i]` is the offset of
+# article i's first entity inside `entity_rows` (length n_articles + 1).
+# A "position" is an entity's 0-based offset inside the segment.
+class Segment:
+    def __init__(self, article_idx, article_ids, entity_rows, article_starts):
+        self.article_idx = readonly(article_idx)
+        self.article_ids = article_ids
+        self.entity_rows = readonly(entity_rows)
+        self.article_starts = readonly(article_starts)
+        # Article of every position, so locate() is a single lookup.
+        self.entity_article = readonly(
+            np.repeat(np.arange(len(article_idx)), np.diff(article_starts))
+        )
+
+    @property
+    def n_articles(self):
+        return len(self.article_idx)
+
+    @property
+    def n_entities(self):
+        return len(self.entity_rows)
+
+    def article_rows(self, article_index):
+        return self.entity_rows[self.article_starts[article_index]:self.article_starts[article_index + 1]]
+
+    def article_size(self, article_index):
+        return int(self.article_starts[article_index + 1] - self.article_starts[article_index])
+
+    def locate(self, position):
+        # position → (article_index, entity_index within that article)
+        article_index = int(self.entity_article[position])
+        return article_index, position - int(self.article_starts[article_index])
+
+    def position(self, article_index, entity_index):
+        return int(self.article_starts[article_index]) + entity_index
+
+
+# ─── Segment Plan ──────────────────────────────────────────────────
+# Everything navigation needs for one (dataset version, lang, segment count),
+# built once per process and shared by all sessions.
+class SegmentPlan:
+    def __init__(self, version, lang, article_idx, segments, method="balanced", cost_model="entities"):
+        self.version = version
+        self.lang = lang
+        self.article_idx = readonly(article_idx)
+        self.segments = segments
+        self.method = method
+        self.cost_model = cost_model
+        self.plan_id = self._plan_id()
+
+    @property
+    def labels(self):
+        return [f"Segment {i+1}" for i in range(len(self.segments))]
+
+    def _plan_id(self):
+        # Same dataset version + same assignment → same ID.
+        content = json.dumps([self.version, self.lang, [seg.article_ids for seg in self.segments]])
+        return hashlib.sha1(content.encode("utf-8")).hexdigest()[:10]
+
+    def to_dict(self):
+        return {
+            "plan_id": self.plan_id,
+            "version": self.version,
+            "lang": self.lang,
+            "method": self.method,
+            "cost_model": self.cost_model,
+            "segments": [
+                {
+                    "article_ids": seg.article_ids,
+                    "n_entities": seg.n_entities,
+                    "est_minutes": round(seg.est_minutes, 1),
+                }
+                for seg in self.segments
+            ],
+        }
+
+
+# ─── Annotation Cost Model ─────────────────────────────────────────
+# Rough annotator time per article: read the article once, then judge each
+# entity and each of its predicted labels. With cost_model="entities" every
+# entity simply counts as one unit.
+READ_CHARS_PER_MINUTE = 1200
+MINUTES_PER_ENTITY = 0.25
+MINUTES_PER_LABEL = 0.3
+
+
+def article_minutes(article_chars, entity_counts, label_counts):
+    return (
+        article_chars / READ_CHARS_PER_MINUTE
+        + entity_counts * MINUTES_PER_ENTITY
+        + label_counts * MINUTES_PER_LABEL
+    )
+
+
+# ─── Packing ───────────────────────────────────────────────────────
+# Both return, per segment, positions into the language's article list.
+def _pack_sequential(counts, num_segments):
+    # Walk articles in article_id order and start a new segment once the
+    # per-segment entity budget would overflow.
+    total = int(counts.sum())
+    budget = total // num_segments + (total % num_segments > 0)
+    bounds, current = [0], 0
+    for i, count in enumerate(counts.tolist()):
+        if current + count > budget and i > bounds[-1]:
+            bounds.append(i)
+            current = 0
+        current += count
+    bounds.append(len(counts))
+    return [list(range(lo, hi)) for lo, hi in zip(bounds[:-1], bounds[1:])]
+
+
+def _pack_balanced(costs, num_segments):
+    # Longest processing time first: hand the costliest remaining article to
+    # the currently lightest segment. Articles stay in article_id order
+    # inside each segment.
+    num_segments = max(1, min(num_segments, len(costs)))
+    heap = [(0.0, i) for i in range(num_segments)]
+    groups = [[] for _ in range(num_segments)]
+    for a in sorted(range(len(costs)), key=lambda a: (-costs[a], a)):
+        load, i = heapq.heappop(heap)
+        groups[i].append(a)
+        heapq.heappush(heap, (load + costs[a], i))
+    groups = [sorted(g) for g in groups if g]
+    return sorted(groups, key=lambda g: g[0])
+
+
+def build_plan(dataset, lang, num_segments=None, method="balanced",
+               cost_model="entities", target_minutes=None):
+    # Entities are stored sorted by article and articles by article_id, so a
+    # language's rows already come out grouped in article_id order.
+    rows = dataset.lang_rows[lang]
+    entity_article = dataset.entities["article_idx"].to_numpy()[rows]
+    article_idx, first, counts = np.unique(entity_article, return_index=True, return_counts=True)
+
+    label_counts = np.add.reduceat((dataset.label_rank[rows] > 0).sum(axis=1), first) if len(rows) else counts
+    minutes = article_minutes(dataset.article_lengths[article_idx], counts, label_counts)
+    costs = minutes if cost_model == "minutes" else counts.astype(float)
+
+    if target_minutes is not None:
+        num_segments = max(1, int(np.ceil(minutes.sum() / target_minutes)))
+    elif num_segments is None:
+        num_segments = LANGUAGE_SEGMENTS.get(lang, 1)
+
+    if method == "sequential":
+        groups = _pack_sequential(counts, num_segments)
+    else:
+        groups = _pack_balanced(costs.tolist(), num_segments)
+
+    segments = []
+    for group in groups:
+        group = np.array(group)
+        seg_rows = np.concatenate([rows[first[a]:first[a] + counts[a]] for a in group])
+        starts = np.concatenate(([0], np.cumsum(counts[group])))
+        segment = Segment(
+            article_idx[group].copy(),
+            [dataset.article_ids[i] for i in article_idx[group]],
+            seg_rows,
+            starts,
+        )
+        segment.est_minutes = float(minutes[group].sum())
+        segments.append(segment)
+    return SegmentPlan(dataset.version, lang, article_idx, segments, method, cost_model)
+
+
+# ─── Plan Persistence ──────────────────────────────────────────────
+def save_plan(plan, plans_dir=PLANS_DIR):
+    os.makedirs(plans_dir, exist_ok=True)
+    path = os.path.join(plans_dir, f"{plan.lang}_{plan.plan_id}.json")
+    if not os.path.exists(path):
+        tmp = f"{path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(plan.to_dict(), f, indent=2)
+        os.replace(tmp, path)
+    return path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build and save segment plans.")
+    parser.add_argument("--lang", action="append", help="language code (repeatable); default: all")
+    parser.add_argument("--segments", type=int, help="number of segments; default: LANGUAGE_SEGMENTS")
+    parser.add_argument("--target-minutes", type=float, help="size segments to about this many minutes")
+    parser.add_argument("--method", choices=["balanced", "sequential"], default="balanced")
+    parser.add_argument("--cost", choices=["minutes", "entities"], default="minutes")
+    args = parser.parse_args()
+
+    dataset = load_dataset()
+    for lang in args.lang or dataset.languages:
+        plan = build_plan(dataset, lang, args.segments, args.method, args.cost, args.target_minutes)
+        path = save_plan(plan)
+        sizes = ", ".join(f"{seg.n_entities} ({seg.est_minutes:.0f} min)" for seg in plan.segments)
+        print(f"✅ {lang}: {sizes} → {path}")
@@ -0,0 +1,40 @@
+import csv
+import io
+
+from store import COLUMNS
+
+# Keys of the per-label response dicts, in CSV column order.
+RESPONSE_FIELDS = [key for _, key in COLUMNS]
+
+
+# ─── Export Buffer ─────────────────────────────────────────────────
+# Append-only, already-encoded CSV of one session's responses – the only
+# copy the session keeps; the store holds the rest. Each row is serialized
+# once when it is appended; the download button only ever reads the
+# accumulated bytes. Output matches DataFrame.to_csv(index=False).
+class ExportBuffer:
+    def __init__(self, fields=RESPONSE_FIELDS):
+        self.fields = list(fields)
+        self._chunks = []
+        self._rows = 0
+        self._append_line(self.fields)
+
+    def _append_line(self, values):
+        line = io.StringIO()
+        csv.writer(line, lineterminator="\n").writerow(values)
+        self._chunks.append(line.getvalue().encode("utf-8"))
+
+    def append(self, rows):
+        for row in rows:
+            self._append_line(["" if row.get(f) is None else row.get(f) for f in self.fields])
+            self._rows += 1
+
+    def __len__(self):
+        return self._rows
+
+    def getvalue(self):
+        # The joined bytes replace the chunks, so the CSV is held once and
+        # reruns without a new submission are free.
+        if len(self._chunks) > 1:
+            self._chunks = [b"".join(self._chunks)]
+        return self._chunks[0]
@@ -0,0 +1,141 @@
+import argparse
+import glob
+import hashlib
+import os
+import pickle
+import time
+
+from dataset import (FORMAT_VERSION, SOURCE_CSV, STORE_DIR, StoreVersionError, load_dataset, read_manifest,
+                     store_lock)
+from ingest import PREDICTIONS_DIR
+from segments import LANGUAGE_SEGMENTS, build_plan, save_plan
+from taxonomy import TAXONOMY_JSON, load_taxonomy
+
+# ─── Startup Snapshot ──────────────────────────────────────────────
+# Everything the app builds before it can show the first entity – the
+# Dataset, the taxonomy index and the default segment plan of every
+# language – pickled to data/snapshot.pkl. Loading it skips hashing the
+# CSV, decoding the entity table and packing segments; the mapped store
+# files are opened again, not copied (see Dataset.__getstate__).
+#
+# The snapshot is keyed on the store version and on the size and mtime of
+# the source files (CSV, taxonomy.json, prediction batches), which a stat
+# answers without reading them. When any of them changes, the snapshot is
+# rebuilt through load_dataset, which rebuilds or updates the store first.
+# It is also keyed on a hash of the modules whose classes and plans it
+# pickles, so an edited Dataset or segmenter never loads a stale snapshot.
+
+SNAPSHOT_FILE = "snapshot.pkl"
+SNAPSHOT_FORMAT = 1
+CODE_MODULES = ["dataset.py", "segments.py", "taxonomy.py", "snapshot.py"]
+
+
+class Startup:
+    def __init__(self, key, dataset, taxonomy, plans):
+        self.key = key
+        self.dataset = dataset
+        self.taxonomy = taxonomy
+        # (lang, num_segments, method, cost_model) → SegmentPlan
+        self.plans = plans
+
+    @property
+    def version(self):
+        return self.dataset.version
+
+
+def _stat(path):
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_size, stat.st_mtime_ns
+
+
+def source_stats(csv_path, taxonomy_path, predictions_dir):
+    batches = sorted(glob.glob(os.path.join(predictions_dir, "*.jsonl")))
+    return _stat(csv_path), _stat(taxonomy_path), [(path, _stat(path)) for path in batches]
+
+
+def code_hash(modules=CODE_MODULES):
+    digest = hashlib.sha256()
+    code_dir = os.path.dirname(os.path.abspath(__file__))
+    for name in modules:
+        with open(os.path.join(code_dir, name), "rb") as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+CODE_HASH = code_hash()
+
+
+def snapshot_key(version, method, cost_model, sources):
+    return SNAPSHOT_FORMAT, FORMAT_VERSION, CODE_HASH, version, method, cost_model, sources
+
+
+def read_snapshot(key, store_dir=STORE_DIR):
+    # The Startup for `key`, or None if the snapshot is missing or stale.
+    path = os.path.join(store_dir, SNAPSHOT_FILE)
+    try:
+        with open(path, "rb") as f:
+            if pickle.load(f) != key:
+                return None
+            return pickle.load(f)
+    except (FileNotFoundError, EOFError, pickle.UnpicklingError, AttributeError, ImportError, StoreVersionError):
+        return None
+
+
+def write_snapshot(startup, store_dir=STORE_DIR):
+    # The key is pickled first, so a stale snapshot is rejected unread.
+    path = os.path.join(store_dir, SNAPSHOT_FILE)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        pickle.dump(startup.key, f, protocol=pickle.HIGHEST_PROTOCOL)
+        pickle.dump(startup, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp, path)
+
+
+def build_startup(store_dir, csv_path, taxonomy_path, method, cost_model, sources):
+    dataset = load_dataset(csv_path, store_dir)
+    taxonomy = load_taxonomy(taxonomy_path)
+    plans = {}
+    for lang in dataset.languages:
+        num_segments = LANGUAGE_SEGMENTS.get(lang, 1)
+        plan = build_plan(dataset, lang, num_segments, method, cost_model)
+        save_plan(plan, os.path.join(store_dir, "plans"))
+        plans[(lang, num_segments, method, cost_model)] = plan
+    return Startup(snapshot_key(dataset.version, method, cost_model, sources), dataset, taxonomy, plans)
+
+
+def load_startup(method="balanced", cost_model="minutes", store_dir=STORE_DIR, csv_path=SOURCE_CSV,
+                 taxonomy_path=TAXONOMY_JSON, predictions_dir=PREDICTIONS_DIR):
+    # Sources are stat-ed before a rebuild, so a change made while it runs
+    # leaves a stale key behind rather than a stale snapshot. The manifest
+    # is read under the same lock as the snapshot, so an ingest cannot land
+    # in between; the Dataset also checks the version it maps.
+    sources = source_stats(csv_path, taxonomy_path, predictions_dir)
+    with store_lock(store_dir):
+        manifest = read_manifest(store_dir)
+        startup = manifest and read_snapshot(snapshot_key(manifest["version"], method, cost_model, sources),
+                                             store_dir)
+    if startup is not None:
+        return startup
+
+    startup = build_startup(store_dir, csv_path, taxonomy_path, method, cost_model, sources)
+    write_snapshot(startup, store_dir)
+    return startup
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build (or check) the startup snapshot the app loads on a cold start.")
+    parser.add_argument("--method", default="balanced")
+    parser.add_argument("--cost-model", default="minutes")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    startup = load_startup(args.method, args.cost_model)
+    built = time.perf_counter() - start
+    start = time.perf_counter()
+    load_startup(args.method, args.cost_model)
+    loaded = time.perf_counter() - start
+    print(f"✅ {os.path.join(STORE_DIR, SNAPSHOT_FILE)} (version {startup.version}, {len(startup.plans)} plans)")
+    print(f"   first call {built * 1000:.1f} ms, from the snapshot {loaded * 1000:.1f} ms")
@@ -0,0 +1,235 @@
+import argparse
+import atexit
+import os
+import queue
+import sqlite3
+import threading
+import time
+
+import pandas as pd
+
+# ─── Response Store ────────────────────────────────────────────────
+# Every submitted label row goes into one SQLite database in WAL mode.
+# WAL lets any number of sessions read while one writes. The background
+# writer (below) commits the submissions that queued up meanwhile, from any
+# number of sessions, in one shared transaction; if it fails, each
+# submission is retried in a transaction of its own. Either way a
+# multi-label entity is stored completely or not at all, and one bad
+# submission cannot take other evaluators' rows down with it.
+
+RESPONSE_DB = "responses/responses.db"
+
+# (db column, key in the response dicts built by eval.py)
+COLUMNS = [
+    ("session_name", "session_name"),
+    ("timestamp", "timestamp"),
+    ("segment", "segement"),
+    ("plan_id", "plan_id"),
+    ("article_id", "article_id"),
+    ("entity_key", "entity_key"),
+    ("lang", "lang"),
+    ("entity_mention", "entity_mention"),
+    ("main_role", "main_role"),
+    ("predicted_role", "predicted_role"),
+    ("label_index", "label_index"),
+    ("total_labels", "total_labels"),
+    ("makes_sense", "makes_sense"),
+    ("confidence", "confidence"),
+]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    id             INTEGER PRIMARY KEY,
+    session_name   TEXT NOT NULL,
+    timestamp      TEXT NOT NULL,
+    segment        INTEGER,
+    plan_id        TEXT,
+    article_id     TEXT NOT NULL,
+    entity_key     TEXT,
+    lang           TEXT NOT NULL,
+    entity_mention TEXT NOT NULL,
+    main_role      TEXT,
+    predicted_role TEXT NOT NULL,
+    label_index    INTEGER,
+    total_labels   INTEGER,
+    makes_sense    TEXT NOT NULL,
+    confidence     INTEGER
+);
+CREATE INDEX IF NOT EXISTS responses_lang ON responses (lang);
+CREATE INDEX IF NOT EXISTS responses_entity ON responses (article_id, entity_mention);
+"""
+# Needs the columns added by create_schema to databases older than them.
+INDEXES = """
+CREATE INDEX IF NOT EXISTS responses_key ON responses (lang, entity_key);
+"""
+
+
+def create_schema(conn):
+    # Databases created before plan_id and entity_key were recorded get the
+    # columns appended; read_frame names its columns, so the order stays the same.
+    conn.executescript(SCHEMA)
+    existing = {row[1] for row in conn.execute("PRAGMA table_info(responses)")}
+    for col, _ in COLUMNS:
+        if col not in existing:
+            conn.execute(f"ALTER TABLE responses ADD COLUMN {col} TEXT")
+    conn.executescript(INDEXES)
+
+
+class ResponseStore:
+    def __init__(self, path=RESPONSE_DB, timeout=30.0):
+        self.path = path
+        self.timeout = timeout
+        # sqlite3 connections are not shared between threads, and Streamlit
+        # runs each session on its own thread.
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        create_schema(self._connect())
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=FULL")
+            self._local.conn = conn
+        return conn
+
+    def write_batch(self, rows):
+        return self.write_batches([rows])
+
+    def write_batches(self, batches):
+        # Several submissions in one transaction: all of them or none. The
+        # writer retries them one by one when a shared transaction fails.
+        values = [tuple(row.get(key) for _, key in COLUMNS) for rows in batches for row in rows]
+        if not values:
+            return 0
+        placeholders = ", ".join("?" for _ in COLUMNS)
+        names = ", ".join(col for col, _ in COLUMNS)
+        conn = self._connect()
+        # IMMEDIATE takes the write lock up front so concurrent writers wait
+        # on busy_timeout instead of failing halfway through the batch.
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany(f"INSERT INTO responses ({names}) VALUES ({placeholders})", values)
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+        return len(values)
+
+    def read_frame(self, lang=None, after_id=0):
+        # after_id: only rows added after that one, for incremental readers.
+        names = ", ".join(col for col, _ in COLUMNS)
+        query = f"SELECT id, {names} FROM responses WHERE id > ?"
+        params = (after_id,)
+        if lang is not None:
+            query += " AND lang = ?"
+            params += (lang,)
+        return pd.read_sql_query(query + " ORDER BY id", self._connect(), params=params)
+
+    def export_csv(self, out_dir="responses"):
+        os.makedirs(out_dir, exist_ok=True)
+        frame = self.read_frame()
+        written = {}
+        for lang, group in frame.groupby("lang"):
+            path = os.path.join(out_dir, f"responses_{lang}_store.csv")
+            group.drop(columns=["id"]).to_csv(path, index=False)
+            written[lang] = path
+        return written
+
+
+# ─── Background Writer ─────────────────────────────────────────────
+# One per server process. Sessions hand their submission to submit() and
+# return immediately; a worker thread drains the queue and commits whatever
+# has accumulated every `flush_interval` seconds or `batch_size` rows,
+# whichever comes first. Failed writes are kept so the app can tell the
+# evaluator that their rows did not reach the store.
+_STOP = object()
+
+
+class ResponseWriter:
+    def __init__(self, store, flush_interval=0.5, batch_size=200):
+        self.store = store
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self._queue = queue.Queue()
+        self._failures = []
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name="response-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def submit(self, rows):
+        self._queue.put(list(rows))
+
+    def _collect(self):
+        first = self._queue.get()
+        if first is _STOP:
+            self._queue.task_done()
+            return None, True
+        batches, count = [first], len(first)
+        deadline = time.monotonic() + self.flush_interval
+        while count < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is _STOP:
+                self._queue.task_done()
+                return batches, True
+            batches.append(item)
+            count += len(item)
+        return batches, False
+
+    def _run(self):
+        stop = False
+        while not stop:
+            batches, stop = self._collect()
+            if batches:
+                self._write(batches)
+
+    def _write(self, batches):
+        try:
+            self.store.write_batches(batches)
+        except Exception:
+            # One bad submission rolls back the whole shared transaction, so
+            # each is retried on its own and only those that fail again are kept.
+            for rows in batches:
+                try:
+                    self.store.write_batch(rows)
+                except Exception as exc:
+                    with self._lock:
+                        self._failures.append((rows, f"{type(exc).__name__}: {exc}"))
+        finally:
+            for _ in batches:
+                self._queue.task_done()
+
+    def flush(self):
+        self._queue.join()
+
+    def take_failures(self, session_name):
+        mine, rest = [], []
+        with self._lock:
+            for failure in self._failures:
+                rows = failure[0]
+                (mine if rows and rows[0].get("session_name") == session_name else rest).append(failure)
+            self._failures = rest
+        return mine
+
+    def close(self):
+        if self._thread.is_alive():
+            self._queue.put(_STOP)
+            self._thread.join()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export the response store to per-language CSV files.")
+    parser.add_argument("--db", default=RESPONSE_DB)
+    parser.add_argument("--out", default="responses")
+    args = parser.parse_args()
+
+    for lang, path in ResponseStore(args.db).export_csv(args.out).items():
+        print(f"✅ {lang} → {path}")
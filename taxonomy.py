@@ -0,0 +1,59 @@
+import html
+import json
+
+import numpy as np
+
+from arrays import readonly
+
+TAXONOMY_JSON = "taxonomy.json"
+
+CHIP_STYLE = "background:#e0e0e0;padding:4px 8px;border-radius:5px;margin:3px;display:inline-block;"
+
+
+# ─── Role Card ─────────────────────────────────────────────────────
+# Role chip plus a collapsible description, as a single HTML block so the
+# app emits one element per role instead of a chip and an expander.
+def render_role_card(entry):
+    role = html.escape(entry["fine_role"])
+    return (
+        f"<span style='{CHIP_STYLE}'>{role}</span>"
+        f"<details class='role-card'><summary>📘 {role}</summary>"
+        f"<p><b>Coarse Role</b>: <code>{html.escape(entry['coarse_role'])}</code></p>"
+        f"<p><b>Description:</b> {html.escape(entry['description'])}</p>"
+        f"<p><b>Example:</b> <i>{html.escape(entry['example'])}</i></p>"
+        f"</details>"
+    )
+
+
+# ─── Taxonomy Index ────────────────────────────────────────────────
+# Fine role IDs are positions in taxonomy.json, the same column order as the
+# label matrices in the dataset store. Coarse role IDs follow first
+# appearance. Built once per process; nothing is mutated afterwards.
+class Taxonomy:
+    def __init__(self, entries):
+        self.entries = entries
+        self.fine_roles = [entry["fine_role"] for entry in entries]
+        self.coarse_roles = list(dict.fromkeys(entry["coarse_role"] for entry in entries))
+        self.fine_id = {role: i for i, role in enumerate(self.fine_roles)}
+        self.coarse_id = {role: i for i, role in enumerate(self.coarse_roles)}
+
+        # fine → coarse as an ID array, coarse → fine as a boolean mask
+        self.fine_to_coarse = readonly(np.array(
+            [self.coarse_id[entry["coarse_role"]] for entry in entries], dtype=np.int8
+        ))
+        mask = np.zeros((len(self.coarse_roles), len(self.fine_roles)), dtype=bool)
+        mask[self.fine_to_coarse, np.arange(len(self.fine_roles))] = True
+        self.coarse_fine_mask = readonly(mask)
+
+        self.cards = [render_role_card(entry) for entry in entries]
+
+    def coarse_members(self, coarse_id):
+        return np.flatnonzero(self.coarse_fine_mask[coarse_id])
+
+    def card(self, fine_id):
+        return self.cards[fine_id]
+
+
+def load_taxonomy(path=TAXONOMY_JSON):
+    with open(path, "r") as f:
+        return Taxonomy(json.load(f))
@@ -0,0 +1,159 @@
+from itertools import permutations
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from agreement import CONFIDENCE_LEVELS, VERDICTS, AgreementStats, load_state, save_state
+from store import COLUMNS, ResponseStore
+
+LANGS = ["en", "hi"]
+ROLES = ["Spy", "Victim", "Tyrant"]
+SESSIONS = ["ann-a", "ann-b", "ann-c", "ann-d"]
+
+
+def random_responses(n=600, seed=0):
+    # Some sessions judge a unit twice; the later rating replaces the earlier.
+    # n stays below a day so the timestamps sort in row order.
+    rng = np.random.default_rng(seed)
+    articles = [f"A{i}" for i in range(25)]
+    article_lang = {a: LANGS[i % len(LANGS)] for i, a in enumerate(articles)}
+    confidence = rng.integers(1, CONFIDENCE_LEVELS + 1, n).astype(float)
+    confidence[rng.random(n) < 0.1] = np.nan
+    article_ids = rng.choice(articles, n)
+    return pd.DataFrame({
+        "article_id": article_ids,
+        "entity_mention": rng.choice(["Zelensky", "Putin"], n),
+        "predicted_role": rng.choice(ROLES, n),
+        "lang": [article_lang[a] for a in article_ids],
+        "session_name": rng.choice(SESSIONS, n),
+        "makes_sense": rng.choice(VERDICTS, n, p=[0.6, 0.3, 0.1]),
+        "confidence": confidence,
+        "timestamp": [f"2026-01-01T{i // 3600:02d}:{i // 60 % 60:02d}:{i % 60:02d}" for i in range(n)],
+    })
+
+
+# ─── Brute Force ───────────────────────────────────────────────────
+# Straight from the definitions, one rating pair at a time.
+def latest_ratings(responses):
+    units = {}
+    for row in responses.itertuples():
+        unit = units.setdefault((row.article_id, row.entity_mention, row.predicted_role), {})
+        unit.pop(row.session_name, None)
+        unit[row.session_name] = (row.makes_sense, row.confidence)
+    return list(units.values())
+
+
+def brute_alpha(values_per_unit, categories, ordinal=False):
+    units = [values for values in values_per_unit if len(values) > 1]
+    pooled = [v for values in units for v in values]
+    n = len(pooled)
+    n_c = {c: pooled.count(c) for c in categories}
+
+    def delta(a, b):
+        if not ordinal:
+            return float(a != b)
+        lo, hi = sorted((categories.index(a), categories.index(b)))
+        between = sum(n_c[c] for c in categories[lo:hi + 1])
+        return (between - (n_c[categories[lo]] + n_c[categories[hi]]) / 2) ** 2
+
+    observed = sum(delta(a, b) / (len(values) - 1) for values in units for a, b in permutations(values, 2))
+    expected = sum(delta(a, b) for a, b in permutations(pooled, 2))
+    return 1 - (n - 1) * observed / expected
+
+
+def brute_fleiss(values_per_unit):
+    units = [values for values in values_per_unit if len(values) > 1]
+    p_i = [sum(values.count(c) * (values.count(c) - 1) for c in VERDICTS) / (len(values) * (len(values) - 1))
+           for values in units]
+    pooled = [v for values in units for v in values]
+    p_e = sum((pooled.count(c) / len(pooled)) ** 2 for c in VERDICTS)
+    return (np.mean(p_i) - p_e) / (1 - p_e)
+
+
+def brute_force(responses):
+    units = latest_ratings(responses)
+    verdicts = [[v for v, _ in unit.values()] for unit in units]
+    confidence = [[int(c) for _, c in unit.values() if c == c] for unit in units]
+    return {
+        "units": len(units),
+        "ratings": sum(map(len, units)),
+        "fleiss_kappa": brute_fleiss(verdicts),
+        "alpha_nominal": brute_alpha(verdicts, VERDICTS),
+        "alpha_confidence": brute_alpha(confidence, list(range(1, CONFIDENCE_LEVELS + 1)), ordinal=True),
+    }
+
+
+# ─── Tests ─────────────────────────────────────────────────────────
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_summary_matches_brute_force(seed):
+    responses = random_responses(seed=seed)
+    stats = AgreementStats()
+    stats.update(responses)
+
+    overall = stats.summary(by=()).iloc[0]
+    for field, value in brute_force(responses).items():
+        assert overall[field] == pytest.approx(value, abs=1e-4), field
+
+    by_lang = stats.summary(by=("lang",)).set_index("lang")
+    for lang, part in responses.groupby("lang"):
+        for field, value in brute_force(part).items():
+            assert by_lang.loc[lang, field] == pytest.approx(value, abs=1e-4), (lang, field)
+
+
+@pytest.mark.parametrize("chunks", [2, 7, 600])
+def test_chunked_updates_match_single_pass(chunks):
+    responses = random_responses()
+    single = AgreementStats()
+    single.update(responses)
+    chunked = AgreementStats()
+    for part in np.array_split(np.arange(len(responses)), chunks):
+        chunked.update(responses.iloc[part])
+
+    assert chunked.ratings == single.ratings
+    for by in [(), ("lang",), ("predicted_role",), ("lang", "predicted_role")]:
+        pd.testing.assert_frame_equal(chunked.summary(by=by), single.summary(by=by), atol=1e-9)
+    pd.testing.assert_frame_equal(chunked.pairwise(), single.pairwise())
+
+
+def test_replayed_and_shuffled_rows_change_nothing():
+    responses = random_responses()
+    single = AgreementStats()
+    single.update(responses)
+    shuffled = AgreementStats()
+    shuffled.update(responses.sample(frac=1, random_state=3))
+    shuffled.update(responses.iloc[:300])
+
+    assert shuffled.ratings == single.ratings
+    # Groups are listed in the order they first came in.
+    by = ["lang", "predicted_role"]
+    pd.testing.assert_frame_equal(shuffled.summary().sort_values(by, ignore_index=True),
+                                  single.summary().sort_values(by, ignore_index=True), atol=1e-9)
+    pd.testing.assert_frame_equal(shuffled.pairwise(), single.pairwise())
+
+
+def test_refresh_reads_only_new_store_rows(tmp_path):
+    responses = random_responses()
+    db = str(tmp_path / "responses.db")
+    store = ResponseStore(db)
+
+    def store_rows(part):
+        store.write_batch([{key: row.get(key) for _, key in COLUMNS} | {"segement": 1}
+                           for row in part.to_dict("records")])
+
+    store_rows(responses.iloc[:400])
+    stats = AgreementStats()
+    added, _ = stats.refresh(paths=[], db=db, archive_dir="")
+    assert added > 0
+    state = str(tmp_path / "state.pkl")
+    save_state(stats, state)
+
+    store_rows(responses.iloc[400:])
+    stats = load_state(state)
+    stats.refresh(paths=[], db=db, archive_dir="")
+    assert stats.refresh(paths=[], db=db, archive_dir="") == (0, [])
+
+    single = AgreementStats()
+    single.update(responses)
+    assert stats.ratings == single.ratings
+    pd.testing.assert_frame_equal(stats.summary(), single.summary(), atol=1e-9)
@@ -0,0 +1,99 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from dataset import ENTITIES_FILE, MATRIX_FILES, _read_table, convert_csv, entity_keys
+from ingest import ingest_file
+from taxonomy import load_taxonomy
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TAXONOMY = os.path.join(REPO_DIR, "taxonomy.json")
+
+
+@pytest.fixture
+def store(tmp_path):
+    # The first few articles of combined_all.csv as a store of their own.
+    df = pd.read_csv(os.path.join(REPO_DIR, "combined_all.csv"), encoding="utf-8")
+    df = df[df["article_id"].isin(df["article_id"].unique()[:3])]
+    csv_path = tmp_path / "combined_all.csv"
+    df.to_csv(csv_path, index=False, encoding="utf-8")
+    store_dir = str(tmp_path / "data")
+    convert_csv(str(csv_path), store_dir, TAXONOMY)
+    return store_dir
+
+
+def read_store(store_dir):
+    entities = _read_table(os.path.join(store_dir, ENTITIES_FILE)).to_pandas()
+    entities.index = entity_keys(entities.astype({"article_id": object}))
+    matrices = {name: np.load(os.path.join(store_dir, f)) for name, f in MATRIX_FILES.items()}
+    return entities, matrices
+
+
+def record(row, taxonomy, **fields):
+    # A prediction batch line for a stored entity row.
+    return {
+        "article_id": row["article_id"], "lang": row["lang"], "entity_mention": row["entity_mention"],
+        "start_offset": int(row["start_offset"]), "end_offset": int(row["end_offset"]),
+        "p_main_role": "Protagonist", "predicted_roles": {"Guardian": 0.7, "Peacemaker": 0.2},
+        "predicted_fine_margin": ["Guardian"],
+    } | fields
+
+
+def ingest(store_dir, tmp_path, records, taxonomy):
+    path = tmp_path / "batch.jsonl"
+    path.write_text("".join(json.dumps(r) + "\n" for r in records), encoding="utf-8")
+    return ingest_file(str(path), store_dir=store_dir, taxonomy=taxonomy)
+
+
+def test_update_keeps_gold_unless_given(store, tmp_path):
+    taxonomy = load_taxonomy(TAXONOMY)
+    before, before_m = read_store(store)
+    with_gold = before[before_m["y_true"].any(axis=1)]
+    kept, replaced = with_gold.iloc[0], with_gold.iloc[1]
+
+    report = ingest(store, tmp_path, [
+        record(kept, taxonomy),
+        record(replaced, taxonomy, fine_grained_roles=["Guardian"]),
+    ], taxonomy)
+    assert (report["updated"], report["appended"], report["rejected"]) == (2, 0, 0)
+
+    after, after_m = read_store(store)
+    assert len(after) == len(before)
+    guardian = taxonomy.fine_id["Guardian"]
+    i, j = after.index.get_loc(kept.name), before.index.get_loc(kept.name)
+    # No gold in the record: the stored gold stays, predictions are replaced.
+    assert after.loc[kept.name, "p_main_role"] == "Protagonist"
+    assert after.loc[kept.name, "fine_grained_roles"] == kept["fine_grained_roles"]
+    assert (after_m["y_true"][i] == before_m["y_true"][j]).all()
+    assert np.flatnonzero(after_m["y_pred"][i]).tolist() == [guardian]
+    assert after_m["label_rank"][i, guardian] == 1
+    assert after.loc[kept.name, "correct"] == bool((after_m["y_true"][i] == after_m["y_pred"][i]).all())
+    # Gold in the record: it replaces the stored gold.
+    k = after.index.get_loc(replaced.name)
+    assert after.loc[replaced.name, "fine_grained_roles"] == "{'Guardian'}"
+    assert np.flatnonzero(after_m["y_true"][k]).tolist() == [guardian]
+    assert bool(after.loc[replaced.name, "correct"])
+
+
+def test_new_span_is_appended(store, tmp_path):
+    taxonomy = load_taxonomy(TAXONOMY)
+    before, before_m = read_store(store)
+    row = before.iloc[0]
+    text = _read_table(os.path.join(store, "articles.arrow")).to_pandas().set_index("article_id").loc[
+        row["article_id"], "text"]
+    mention = text[:5]
+    report = ingest(store, tmp_path, [
+        record(row, taxonomy, entity_mention=mention, start_offset=0, end_offset=5, fine_grained_roles=[]),
+    ], taxonomy)
+    assert (report["updated"], report["appended"]) == (0, 1)
+
+    after, after_m = read_store(store)
+    assert len(after) == len(before) + 1
+    new = after.index.get_loc(f"{row['article_id']}#0-5#{mention}")
+    assert not after_m["y_true"][new].any()
+    for key in before.index:
+        # Existing rows are untouched, wherever sorting moved them.
+        assert (after_m["y_true"][after.index.get_loc(key)] == before_m["y_true"][before.index.get_loc(key)]).all()
@@ -0,0 +1,79 @@
+import time
+
+import pytest
+
+import leases
+from leases import LeaseService
+from store import COLUMNS, ResponseStore
+
+LANG = "en"
+KEYS = [f"EN_{i}.txt#10-15#Mention {i}" for i in range(4)]
+
+
+@pytest.fixture
+def db(tmp_path):
+    return str(tmp_path / "responses.db")
+
+
+def judge(store, session, key, entity_key=True):
+    # One stored label row for `key`, with or without its entity_key.
+    article_id, _, mention = key.split("#", 2)
+    row = {k: None for _, k in COLUMNS} | {
+        "session_name": session, "timestamp": "2026-01-01T00:00:00", "article_id": article_id,
+        "entity_key": key if entity_key else None, "lang": LANG, "entity_mention": mention,
+        "predicted_role": "Spy", "makes_sense": "Yes",
+    }
+    store.write_batch([row])
+
+
+def test_acquire_keeps_lease_and_skips_leased(db):
+    service = LeaseService(db, target=1)
+    a = service.acquire("ann-a", LANG, KEYS)
+    assert a["entity_key"] == KEYS[0]
+    # Asking again returns the held lease.
+    assert service.acquire("ann-a", LANG, KEYS)["id"] == a["id"]
+    # An entity leased to someone else counts toward the target.
+    assert service.acquire("ann-b", LANG, KEYS)["entity_key"] == KEYS[1]
+
+
+def test_expired_lease_is_reclaimed(db):
+    service = LeaseService(db, lease_seconds=0.05, target=1)
+    a = service.acquire("ann-a", LANG, KEYS[:1])
+    assert service.acquire("ann-b", LANG, KEYS[:1]) is None
+    time.sleep(0.1)
+    b = service.acquire("ann-b", LANG, KEYS[:1])
+    assert b["entity_key"] == KEYS[0]
+    status = service._connect().execute("SELECT status FROM leases WHERE id = ?", (a["id"],)).fetchone()[0]
+    assert status == "expired"
+
+
+def test_coverage_counts_stored_responses(db):
+    store = ResponseStore(db)
+    service = LeaseService(db, target=2)
+    # Segment-mode judgments and legacy rows without entity_key both count;
+    # several label rows of one session are one judgment.
+    judge(store, "ann-a", KEYS[0])
+    judge(store, "ann-a", KEYS[0])
+    judge(store, "ann-b", KEYS[0], entity_key=False)
+    judge(store, "ann-a", KEYS[1])
+    assert service.coverage(LANG, KEYS) == {KEYS[0]: 2, KEYS[1]: 1}
+    # KEYS[0] is fully judged and ann-a has judged KEYS[1] already; after
+    # that, least-covered first.
+    assert service.acquire("ann-a", LANG, KEYS)["entity_key"] == KEYS[2]
+    assert service.acquire("ann-c", LANG, KEYS)["entity_key"] == KEYS[3]
+    assert service.acquire("ann-d", LANG, KEYS)["entity_key"] == KEYS[1]
+
+
+def test_completed_lease_without_rows_stops_counting(db, monkeypatch):
+    ResponseStore(db)
+    service = LeaseService(db, target=1)
+    lease = service.acquire("ann-a", LANG, KEYS[:1])
+    service.complete(lease["id"])
+    # Until the writer stores the rows, the completed lease stands in for them.
+    assert service.coverage(LANG, KEYS) == {KEYS[0]: 1}
+    assert service.acquire("ann-b", LANG, KEYS[:1]) is None
+    # The rows never arrived (the write failed): the entity is served again.
+    monkeypatch.setattr(leases, "PENDING_SECONDS", 0)
+    time.sleep(0.01)
+    assert service.coverage(LANG, KEYS) == {}
+    assert service.acquire("ann-b", LANG, KEYS[:1])["entity_key"] == KEYS[0]
@@ -0,0 +1,80 @@
+import numpy as np
+import pandas as pd
+
+from preprocess import RELOCATE_WINDOW, check_span, span_flags, validate_spans
+
+WORDS = ["the", "minister", "said", "on", "tuesday", "that", "talks", "would", "resume", "in", "spring"]
+
+
+def synthetic_articles(n_articles=40, mentions_per_article=25, seed=0):
+    # Filler text with unique mentions at known offsets.
+    rng = np.random.default_rng(seed)
+    texts, rows = {}, []
+    for a in range(n_articles):
+        article_id, parts, pos = f"EN_{a}.txt", [], 0
+        for m in range(mentions_per_article):
+            filler = " ".join(rng.choice(WORDS, rng.integers(3, 30))) + " "
+            mention = f"Person {a}-{m}" if m % 3 else f"Org{a}x{m} Ltd"
+            parts += [filler, mention, " "]
+            start = pos + len(filler)
+            rows.append((article_id, "en", mention, start, start + len(mention)))
+            pos = start + len(mention) + 1
+        texts[article_id] = "".join(parts)
+    truth = pd.DataFrame(rows, columns=["article_id", "lang", "entity_mention", "start_offset", "end_offset"])
+    return truth, texts
+
+
+def test_check_span_repairs():
+    text = "Talks with Zelensky resumed."
+    assert check_span(text, 11, 19, "Zelensky") == ("ok", 11, 19)
+    assert check_span(text, 11, 18, "Zelensky") == ("end_inclusive", 11, 19)
+    assert check_span(text, 11, 20, "Zelensky") == ("end_overshoot", 11, 19)
+    assert check_span(text, 12, 20, "Zelensky") == ("shift_left", 11, 19)
+    assert check_span(text, 10, 18, "Zelensky") == ("shift_right", 11, 19)
+    assert check_span(text, 11, 25, "Zelensky") == ("length", 11, 19)
+    assert check_span(text, 0, 4, "Zelensky") == ("relocated", 11, 19)
+    assert check_span(text, 0, 4, "Putin") == ("unresolved", 0, 4)
+
+
+def test_injected_offset_errors_are_restored():
+    truth, texts = synthetic_articles()
+    rng = np.random.default_rng(1)
+    # Every kind of error the validator knows, plus spans left intact.
+    errors = [(0, 0), (0, -1), (0, 1), (1, 1), (-1, -1), (0, 4), (0, -3), (25, 25), (-60, -60)]
+    picked = rng.integers(0, len(errors), len(truth))
+    ds = np.array([errors[i][0] for i in picked])
+    de = np.array([errors[i][1] for i in picked])
+    perturbed = truth.assign(start_offset=truth["start_offset"] + ds, end_offset=truth["end_offset"] + de)
+
+    spans, report = validate_spans(perturbed, texts, workers=1)
+    restored = ((spans["start_offset"] == truth["start_offset"]) & (spans["end_offset"] == truth["end_offset"])).mean()
+    assert restored >= 0.99
+    assert (spans.loc[picked == 0, "span_status"] == "ok").all()
+    assert report["en"]["unresolved"] <= 0.01 * len(truth)
+    assert not spans["duplicate_span"].any() and not spans["overlapping_span"].any()
+
+
+def test_relocation_stays_in_window():
+    text = "x" * (RELOCATE_WINDOW + 50) + "Zelensky"
+    assert check_span(text, 0, 8, "Zelensky")[0] == "unresolved"
+    assert check_span(text, 60, 68, "Zelensky")[0] == "relocated"
+
+
+def test_duplicate_and_overlap_flags():
+    spans = [
+        ("A", 0, 5, True, False),     # duplicate pair
+        ("A", 0, 5, True, False),
+        ("A", 10, 20, False, True),   # partial overlap
+        ("A", 15, 25, False, True),
+        ("A", 30, 35, False, False),
+        ("A", 40, 50, False, True),   # contains both of the next two
+        ("A", 42, 45, False, True),
+        ("A", 46, 48, False, True),   # only overlaps 40–50, not its neighbour
+        ("B", 0, 5, False, False),    # adjacent spans: end is exclusive
+        ("B", 5, 9, False, False),
+        ("C", 10, 20, False, False),  # same offsets as in A, other article
+    ]
+    article_ids, starts, ends, duplicate, overlap = map(list, zip(*spans))
+    got_duplicate, got_overlap = span_flags(np.array(article_ids, dtype=object), np.array(starts), np.array(ends))
+    assert got_duplicate.tolist() == duplicate
+    assert got_overlap.tolist() == overlap